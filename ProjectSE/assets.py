@@ -0,0 +1,97 @@
+import threading
+import time
+import pygame
+
+
+class AssetManager:
+    # Loads each asset file once, however many names it is used under. What the Start screen
+    # needs is loaded up front; everything else goes to a background thread, and asking for an
+    # asset that is still loading waits for that asset only.
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.timings = []  # (label, seconds, thread)
+        self.milestones = []  # (label, seconds since start)
+        self.images = {}
+        self.fonts = {}
+        self.sounds = {}
+        self.pending = {}  # path -> Event set once the background thread has loaded it
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def timed(self, label, load, *args):
+        start = time.perf_counter()
+        result = load(*args)
+        self.timings.append((label, time.perf_counter() - start, threading.current_thread().name))
+        return result
+
+    def mark(self, label):
+        self.milestones.append((label, time.perf_counter() - self.started))
+
+    def image(self, path):
+        if path not in self.images:
+            self.images[path] = self.timed(path, lambda: pygame.image.load(path).convert())
+        return self.images[path]
+
+    def font(self, path, size):
+        key = (path, size)
+        if key not in self.fonts:
+            self.fonts[key] = self.load_font(path, size)
+        return self.fonts[key]
+
+    def load_font(self, path, size):
+        # Not kept; for fonts whose owner decides how long they live (see Viewport.font)
+        return self.timed(f"{path or 'default font'} @ {size}", pygame.font.Font, path, size)
+
+    def _load_sound(self, path):
+        try:
+            return self.timed(path, pygame.mixer.Sound, path)
+        except pygame.error as e:
+            print(f"Error: could not load {path}: {e}")
+            return None
+
+    def sound(self, path):
+        with self.lock:
+            if path in self.sounds:
+                return self.sounds[path]
+            loading = self.pending.get(path)
+
+        if loading is not None:
+            loading.wait()
+            return self.sounds.get(path)
+
+        sound = self._load_sound(path)
+        with self.lock:
+            self.sounds[path] = sound
+        return sound
+
+    def load_in_background(self, paths, before=None):
+        # Load the given sound files on a worker thread; before() runs there first (e.g. mixer init)
+        with self.lock:
+            paths = [path for path in dict.fromkeys(paths) if path not in self.sounds and path not in self.pending]
+            for path in paths:
+                self.pending[path] = threading.Event()
+
+        def worker():
+            if before is not None:
+                try:
+                    self.timed(f"{before.__module__}.{before.__name__}", before)
+                except pygame.error as e:
+                    print(f"Error: {e}")
+            for path in paths:
+                sound = self._load_sound(path)
+                with self.lock:
+                    self.sounds[path] = sound
+                    loading = self.pending.pop(path)
+                loading.set()
+
+        self.thread = threading.Thread(target=worker, name='asset-loader', daemon=True)
+        self.thread.start()
+
+    def report(self):
+        print("Startup timing:")
+        for label, seconds, thread in self.timings:
+            where = '' if thread == 'MainThread' else f" [{thread}]"
+            print(f"  {label:<28} {seconds * 1000:8.1f} ms{where}")
+        for label, seconds in self.milestones:
+            print(f"  -> {label:<25} {seconds * 1000:8.1f} ms after start")
+
@@ -0,0 +1,81 @@
+import time
+from collections import deque
+
+import pygame
+
+from profiler import percentile
+
+FREQUENCY = 44100
+BUFFER = 512  # Samples per mixer buffer: about 12 ms at 44.1 kHz, against SDL's default 4096 (about 93 ms)
+
+# Channels reserved for each category, so a sound never waits for (or cuts off) one from another category
+CATEGORIES = {
+    'feedback': 2,  # correct / wrong
+    'alert': 1,     # time up
+    'ui': 1,        # button clicks
+}
+
+
+class Audio:
+    # Named sounds played on per-category reserved channels. The clips are decoded once by the
+    # asset manager (two names on the same file share the decode) and the mixer runs a small buffer.
+    def __init__(self, assets, buffer=BUFFER):
+        self.assets = assets
+        self.buffer = buffer
+        self.sounds = {}  # name -> (path, category)
+        self.channels = {}  # category -> [Channel], filled in by init()
+        self.next_channel = {category: 0 for category in CATEGORIES}
+        self.latency = {category: deque(maxlen=200) for category in CATEGORIES}
+        pygame.mixer.pre_init(FREQUENCY, -16, 2, buffer)
+
+    def add(self, name, path, category):
+        self.sounds[name] = (path, category)
+
+    def paths(self):
+        return [path for path, _ in self.sounds.values()]
+
+    def init(self):
+        # Open the device and hand out the reserved channels; pygame's own Sound.play() never picks these
+        pygame.mixer.init()
+        reserved = sum(CATEGORIES.values())
+        pygame.mixer.set_num_channels(max(8, reserved + 4))
+        pygame.mixer.set_reserved(reserved)
+        first = 0
+        for category, count in CATEGORIES.items():
+            self.channels[category] = [pygame.mixer.Channel(first + i) for i in range(count)]
+            first += count
+
+    @property
+    def output_latency(self):
+        # Seconds a sample waits in the mixer buffer before it reaches the device
+        return self.buffer / FREQUENCY
+
+    def play(self, name, since=None):
+        # since is the perf_counter time the sound was due, for the latency stats: the input that caused
+        # it, plus any delay the game puts in on purpose (e.g. the answer check after a pair is picked)
+        path, category = self.sounds[name]
+        sound = self.assets.sound(path)
+        channels = self.channels.get(category)
+        if sound is None or not channels:
+            return
+        # A free channel of the category, otherwise the one that started longest ago
+        channel = next((channel for channel in channels if not channel.get_busy()), None)
+        if channel is None:
+            index = self.next_channel[category]
+            channel = channels[index]
+            self.next_channel[category] = (index + 1) % len(channels)
+        channel.play(sound)
+        if since is not None:
+            self.latency[category].append(time.perf_counter() - since)
+
+    def report(self):
+        parts = []
+        for category, samples in self.latency.items():
+            if samples:
+                ordered = sorted(samples)
+                parts.append(f"{category} p50/p95/max {percentile(ordered, 50) * 1000:.1f}/"
+                             f"{percentile(ordered, 95) * 1000:.1f}/{ordered[-1] * 1000:.1f} ms")
+        if not parts:
+            return "no sounds played"
+        return (f"input to sound start: {', '.join(parts)} "
+                f"(+{self.output_latency * 1000:.1f} ms mixer buffer)")
@@ -0,0 +1,51 @@
+import math
+import pygame
+
+
+class ScrollingBackground:
+    # The background tiled once into a strip one tile wider than the screen. Each frame shows a
+    # screen-sized window of the strip with a single area blit, sliding left at speed pixels/second.
+    # Strips are kept for the last couple of window sizes, so switching back and forth (e.g. in and
+    # out of fullscreen) doesn't scale the image again.
+    def __init__(self, image, width, height, speed=60, scale=1.0):
+        self.image = image
+        self.base_speed = speed
+        self.strips = {}  # (width, height, scale) -> (strip, tile width, visible height, speed)
+        self.offset = 0.0
+        self.tile_width = None
+        self.paused = False
+        self.resize(width, height, scale)
+
+    def resize(self, width, height, scale=1.0):
+        key = (width, height, scale)
+        if key not in self.strips:
+            if len(self.strips) >= 2:
+                del self.strips[next(iter(self.strips))]
+            self.strips[key] = self.build(width, height, scale)
+        phase = self.offset / self.tile_width if self.tile_width else 0.0  # Keep the scroll position
+        self.width = width
+        self.strip, self.tile_width, self.height, self.speed = self.strips[key]
+        self.offset = phase * self.tile_width
+
+    def build(self, width, height, scale):
+        # Scaled with the canvas, and at least far enough to cover the window's height
+        image = self.image
+        factor = max(scale, height / image.get_height())
+        if factor != 1:
+            size = (round(image.get_width() * factor), round(image.get_height() * factor))
+            image = pygame.transform.smoothscale(image, size)
+        tile_width = image.get_width()
+        visible = min(height, image.get_height())
+
+        tiles = math.ceil(width / tile_width) + 1
+        strip = pygame.Surface((tiles * tile_width, visible)).convert(image)
+        for i in range(tiles):
+            strip.blit(image, (i * tile_width, 0))
+        return strip, tile_width, visible, self.base_speed * factor
+
+    def update(self, dt):
+        if not self.paused:
+            self.offset = (self.offset + self.speed * dt) % self.tile_width
+
+    def draw(self, surface):
+        return surface.blit(self.strip, (0, 0), (int(self.offset), 0, self.width, self.height))
@@ -0,0 +1,339 @@
+# Headless benchmarks for the game's hot paths.
+#
+#   python bench.py                      run, write bench_results.json, compare with bench_baseline.json
+#   python bench.py --update-baseline    run and store the results as the new baseline
+#
+# Exits with status 1 if any benchmark is slower than the baseline by more than --tolerance and by
+# more than --noise microseconds per call, and still is when measured again (--rechecks).
+#
+# How fast some benchmarks run depends on the process (memory layout, hash seed) as much as on the
+# code, by up to half again. So the baseline is the median of several processes, and a benchmark
+# that looks slower is measured again in a new process before it counts.
+import argparse
+import gc
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+BENCH_PATH = os.path.abspath(__file__)
+os.chdir(os.path.dirname(BENCH_PATH))  # main.py loads its assets from the working directory
+
+import pygame
+import main
+import puzzlebank
+from engine import GameEngine
+from equations import SolutionIndex
+from textcache import OutlinedTextCache
+
+RESULTS_PATH = 'bench_results.json'
+BASELINE_PATH = 'bench_baseline.json'
+
+# Benchmarks faster than FAST_US per call are measured again with FAST_REPEAT runs, as a few
+# microseconds is as much as a busy moment on the machine adds
+FAST_US = 10
+FAST_REPEAT = 31
+
+# Times a benchmark that looks slower than the baseline allows is measured again before it counts,
+# and processes the baseline is the median of
+RECHECKS = 2
+BASELINE_PROCESSES = 5
+
+benchmarks = {}
+
+
+def benchmark(name):
+    # Register a setup function that returns the callable to time
+    def register(setup):
+        benchmarks[name] = setup
+        return setup
+    return register
+
+
+def measure(fn, min_time=0.1, repeat=7):
+    # Best seconds per call over `repeat` runs of enough calls to take at least min_time,
+    # with the garbage collector off like timeit
+    gc.collect()
+    gc.disable()
+    try:
+        return _measure(fn, min_time, repeat)
+    finally:
+        gc.enable()
+
+
+def _measure(fn, min_time, repeat):
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        number *= 2
+
+    best = elapsed / number
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def random_boards(count, size=12, seed=1):
+    rng = random.Random(seed)
+    return [[rng.randint(1, 10) for _ in range(size)] for _ in range(count)]
+
+
+@benchmark('equation.new_board')
+def bench_new_board():
+    engine = GameEngine(rng=random.Random(1))
+    return engine.new_board
+
+
+@benchmark('equation.bank_board')
+def bench_bank_board():
+    path = os.path.join(tempfile.mkdtemp(), 'puzzles.bin')
+    puzzlebank.generate(path, 1200, seed=1)
+    engine = GameEngine(rng=random.Random(1), bank=puzzlebank.PuzzleBank(path))
+    engine.tier = 'HARD'  # The puzzle bank samples by tier, not by difficulty
+    return engine.new_board
+
+
+@benchmark('equation.index')
+def bench_index():
+    boards = itertools.cycle(random_boards(1000))
+    return lambda: SolutionIndex(next(boards))
+
+
+@benchmark('equation.sample')
+def bench_sample():
+    rng = random.Random(1)
+    indexes = itertools.cycle([SolutionIndex(board) for board in random_boards(1000)])
+    return lambda: next(indexes).sample(rng)
+
+
+@benchmark('check_answer')
+def bench_check_answer():
+    engine = GameEngine(rng=random.Random(1))
+    a, b = engine.equation.pair
+    wrong = [(a, 0), (b + 1, 1)]  # A pair that doesn't solve the equation, so the board stays put
+
+    def run():
+        engine.selected = list(wrong)
+        engine.check_answer()
+        engine.scheduler.clear()  # Drop the hide callback check_answer scheduled
+    return run
+
+
+def draw_board_setup(game, reveal):
+    screen = game.gameScreen
+    engine = screen.engine
+    engine.reset()
+    for index in range(len(engine.revealed)):
+        engine.revealed[index] = reveal(index)
+    if reveal is pair:
+        engine.selected = [(engine.board_numbers[i], i) for i in (0, 1)]
+    return screen.draw_board
+
+
+def pair(index):
+    return index < 2
+
+
+@benchmark('draw_board.hidden')
+def bench_draw_board_hidden(game):
+    return draw_board_setup(game, lambda index: False)
+
+
+@benchmark('draw_board.pair_selected')
+def bench_draw_board_pair(game):
+    return draw_board_setup(game, pair)
+
+
+@benchmark('draw_board.half_revealed')
+def bench_draw_board_half(game):
+    return draw_board_setup(game, lambda index: index % 2 == 0)
+
+
+@benchmark('draw_board.all_revealed')
+def bench_draw_board_all(game):
+    return draw_board_setup(game, lambda index: True)
+
+
+@benchmark('draw_text.cached')
+def bench_draw_text():
+    return lambda: main.draw_text("SCORE: 12", main.text_font, main.white, main.green, 990, 60)
+
+
+@benchmark('draw_text.uncached')
+def bench_draw_text_uncached():
+    cache = OutlinedTextCache(max_size=1)
+    texts = itertools.cycle([f"TIME: {n}" for n in range(100)])
+    return lambda: cache.draw(main.screen, next(texts), main.text_font.font, main.white, main.green, 990, 20)
+
+
+@benchmark('title_text.cached')
+def bench_title_text():
+    return lambda: main.title_text("Math Mastery Flip", main.title_font, main.white, main.green, 300, 50)
+
+
+def frame_setup(game, state):
+    game.gameStateManager.set_State(state)
+    if state == 'gameScreen':
+        main.difficulty = 'EASY'
+        game.gameScreen.reset()
+    game.frame()  # Let the state settle (first frame of a state does one-off work)
+    return game.frame
+
+
+@benchmark('frame.start')
+def bench_frame_start(game):
+    return frame_setup(game, 'start')
+
+
+@benchmark('frame.mode')
+def bench_frame_mode(game):
+    return frame_setup(game, 'mode')
+
+
+@benchmark('frame.gameScreen')
+def bench_frame_game_screen(game):
+    return frame_setup(game, 'gameScreen')
+
+
+@benchmark('frame.gameResult')
+def bench_frame_game_result(game):
+    return frame_setup(game, 'gameResult')
+
+
+def run_benchmarks(names, game):
+    results = {}
+    for name in names:
+        setup = benchmarks[name]
+        fn = setup(game) if setup.__code__.co_argcount else setup()
+        seconds = measure(fn)
+        if seconds * 1e6 < FAST_US:
+            seconds = min(seconds, measure(fn, repeat=FAST_REPEAT))
+        results[name] = {'us_per_call': round(seconds * 1e6, 3), 'calls_per_sec': round(1 / seconds, 1)}
+        print(f"{name:<28} {seconds * 1e6:12.2f} us/call")
+    return results
+
+
+def run_elsewhere(names):
+    # The benchmarks run in a new interpreter; returns their results
+    with tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, RESULTS_PATH)
+        subprocess.run([sys.executable, BENCH_PATH, *names, '--measure-only', '--output', output],
+                       check=True, stdout=subprocess.DEVNULL)
+        with open(output) as f:
+            return {name: result for name, result in json.load(f)['results'].items() if name in names}
+
+
+def median_results(runs):
+    # Per benchmark, the result of the run with the median time
+    return {name: sorted((run[name] for run in runs), key=lambda result: result['us_per_call'])[len(runs) // 2]
+            for name in runs[0]}
+
+
+def compare(results, baseline, tolerance, noise):
+    # Returns the names of benchmarks that got slower than the baseline allows
+    regressions = []
+    print(f"\n{'benchmark':<28} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, result in results.items():
+        if name not in baseline:
+            print(f"{name:<28} {'-':>12} {result['us_per_call']:12.2f}      new")
+            continue
+        before = baseline[name]['us_per_call']
+        change = result['us_per_call'] / before - 1
+        flag = ''
+        if change > tolerance and result['us_per_call'] - before > noise:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f"{name:<28} {before:12.2f} {result['us_per_call']:12.2f} {change:+7.0%}{flag}")
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Math Mastery Flip benchmarks")
+    parser.add_argument('only', nargs='*', help="only run benchmarks starting with these names")
+    parser.add_argument('--output', default=RESULTS_PATH, help="where to write the results")
+    parser.add_argument('--baseline', default=BASELINE_PATH, help="results to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.3, help="allowed slowdown (0.3 = 30%%)")
+    parser.add_argument('--noise', type=float, default=0.5, help="slowdown in us per call too small to count")
+    parser.add_argument('--rechecks', type=int, default=RECHECKS,
+                        help="times to measure a benchmark again before calling it a regression")
+    parser.add_argument('--update-baseline', action='store_true', help="save the results as the baseline")
+    parser.add_argument('--processes', type=int, default=BASELINE_PROCESSES,
+                        help="processes to take the median of for --update-baseline")
+    parser.add_argument('--measure-only', action='store_true', help="write the results without comparing")
+    args = parser.parse_args()
+
+    # A throwaway database so benchmarking never touches game_data.db
+    db_dir = tempfile.mkdtemp()
+    game = main.Game(fps=0, db_path=os.path.join(db_dir, 'bench.db'))
+    game.clock.idle_fps = 0  # Never throttle
+    main.user_name = 'bench'
+
+    names = [name for name in benchmarks if not args.only or any(name.startswith(prefix) for prefix in args.only)]
+    results = run_benchmarks(names, game)
+    game.result_store.close()
+
+    baseline = None
+    regressions = []
+    if args.update_baseline:
+        runs = [results]
+        for number in range(2, args.processes + 1):
+            print(f"Measuring in process {number} of {args.processes}")
+            runs.append(run_elsewhere(names))
+        results = median_results(runs)
+    elif not args.measure_only and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.tolerance, args.noise)
+        # Only the best of the measurements counts, so a regression has to show in every process
+        for _ in range(args.rechecks):
+            if not regressions:
+                break
+            print(f"\nMeasuring again in a new process: {', '.join(regressions)}")
+            for name, result in run_elsewhere(regressions).items():
+                if result['us_per_call'] < results[name]['us_per_call']:
+                    results[name] = result
+            regressions = compare({name: results[name] for name in regressions}, baseline, args.tolerance,
+                                  args.noise)
+
+    report = {
+        'python': platform.python_version(),
+        'pygame': pygame.version.ver,
+        'machine': platform.machine(),
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline updated: {args.baseline}")
+        sys.exit(0)
+
+    if args.measure_only:
+        sys.exit(0)
+
+    if baseline is None:
+        print(f"No baseline at {args.baseline}; run with --update-baseline to create one")
+        sys.exit(0)
+
+    if regressions:
+        print(f"\n{len(regressions)} benchmark(s) regressed: {', '.join(regressions)}")
+        sys.exit(1)
+    print("\nNo regressions")
@@ -0,0 +1,64 @@
+class Observable:
+    # A value that calls its watchers when it is set to something different
+    __slots__ = ('value', 'watchers')
+
+    def __init__(self, value=None):
+        self.value = value
+        self.watchers = []
+
+    def set(self, value):
+        if value == self.value:
+            return
+        self.value = value
+        for watcher in self.watchers:
+            watcher(value)
+
+    def watch(self, watcher):
+        # The watcher is called with the current value straight away, then on every change
+        self.watchers.append(watcher)
+        watcher(self.value)
+
+
+class BoundLabel:
+    # Keeps a pygame_gui label showing template.format(value); set_text only runs when the value changes
+    def __init__(self, label, observable, template):
+        self.label = label
+        self.template = template
+        self.updates = 0
+        observable.watch(self.update)
+
+    def update(self, value):
+        self.label.set_text(self.template.format(value))
+        self.updates += 1
+
+
+class BoundText:
+    # An outlined text readout (see textcache.py) that is only formatted and looked up again when its
+    # value changes; in between, draw() is a single blit
+    def __init__(self, observable, template, cache, font, text_col, outline_col, x, y):
+        self.template = template
+        self.cache = cache
+        self.font = font
+        self.text_col = text_col
+        self.outline_col = outline_col
+        self.x = x
+        self.y = y
+        self.updates = 0
+        observable.watch(self.update)
+
+    def update(self, value):
+        self.value = value
+        self.text = self.template.format(value)
+        self.image = self.cache.render(self.text, self.font, self.text_col, self.outline_col)
+        self.updates += 1
+
+    def rescale(self, font, x, y):
+        # Same value in a different font size and place, e.g. after the window was resized
+        self.font = font
+        self.x = x
+        self.y = y
+        self.update(self.value)
+
+    def draw(self, surface):
+        outline = self.cache.outline
+        return surface.blit(self.image, (self.x - outline, self.y - outline))
@@ -0,0 +1,125 @@
+import pygame
+
+DOWN = 'down'  # Face of a card that hasn't been turned over; face-up cards show their number
+COLORKEY = (255, 0, 255)  # Around the rounded corners and the squashed frames; never drawn to the screen
+
+FLIP_TIME = 0.2  # Seconds for a card to turn over
+FLIP_STEPS = 4   # Squashed frames for each half of a flip, the last being the full-width face
+
+
+class CardAtlas:
+    # Every image a card can show, rendered once for one card size: face down, face up for each
+    # value (with the stroke revealed and selected cards get) and the squashed in-between frames of a flip.
+    # The frames never change, so they are RLE-encoded and their transparent parts cost nothing to blit.
+    def __init__(self, size, stroke, font, face_col, stroke_col, text_col, values=range(1, 11)):
+        self.size = size
+        self.frames = {}  # (face, step) -> Surface; step FLIP_STEPS is the face at full width
+
+        rect = pygame.Rect(0, 0, size, size)
+        faces = {DOWN: self.card(rect, face_col)}
+        for value in values:
+            face = self.card(rect, face_col)
+            number = font.render(str(value), True, text_col, face_col)
+            face.blit(number, number.get_rect(center=rect.center))
+            pygame.draw.rect(face, stroke_col, rect, stroke)
+            faces[value] = face
+
+        for face, image in faces.items():
+            for step in range(FLIP_STEPS + 1):
+                frame = self.squash(image, step)
+                frame.set_colorkey(COLORKEY, pygame.RLEACCEL)
+                self.frames[face, step] = frame
+
+    def card(self, rect, face_col):
+        surface = pygame.Surface(rect.size).convert()
+        surface.fill(COLORKEY)
+        pygame.draw.rect(surface, face_col, rect, 0, max(2, 5 * self.size // 130))  # 5 px corners on 130 px cards
+        return surface
+
+    def squash(self, image, step):
+        # The face narrowed to step / FLIP_STEPS of its width, centred on a card-sized surface;
+        # scaled without smoothing so the colorkey stays exact
+        if step == FLIP_STEPS:
+            return image
+        frame = pygame.Surface(image.get_size()).convert()
+        frame.fill(COLORKEY)
+        width = self.size * step // FLIP_STEPS
+        if width:
+            narrow = pygame.transform.scale(image, (width, self.size))
+            frame.blit(narrow, ((self.size - width) // 2, 0))
+        return frame
+
+    def get(self, face, step=FLIP_STEPS):
+        return self.frames[face, step]
+
+
+class Card:
+    # One card. show() sets the face it should end up on; update() plays the flip towards it, which
+    # only changes which atlas frame the card points at
+    __slots__ = ('atlas', 'rect', 'face', 'target', 'flip_time', 'image', 'changed')
+
+    def __init__(self, atlas, rect):
+        self.atlas = atlas
+        self.rect = pygame.Rect(rect)
+        self.face = DOWN  # Face it is showing, or flipping away from
+        self.target = DOWN
+        self.flip_time = None  # Seconds into the current flip, None when still
+        self.image = atlas.get(DOWN)
+        self.changed = True  # The image differs from the one last drawn
+
+    def show(self, face):
+        if face == self.target:
+            return
+        if self.flip_time is None:
+            self.flip_time = 0.0
+        elif self.flip_time >= FLIP_TIME / 2:
+            # Already showing the old target's half; turn away from that instead
+            self.face = self.target
+            self.flip_time = FLIP_TIME - self.flip_time
+        self.target = face
+
+    def update(self, dt):
+        if self.flip_time is None:
+            return
+        self.flip_time += dt
+        progress = min(1.0, self.flip_time / FLIP_TIME)
+        if progress < 0.5:
+            image = self.atlas.get(self.face, round((1 - 2 * progress) * FLIP_STEPS))
+        else:
+            image = self.atlas.get(self.target, round((2 * progress - 1) * FLIP_STEPS))
+        if progress >= 1.0:
+            self.face = self.target
+            self.flip_time = None
+        if image is not self.image:
+            self.image = image
+            self.changed = True
+
+
+class CardBoard:
+    # The cards of a layout, put up with one blits() call of atlas frames. The scrolling background
+    # repaints the whole screen each frame, so every card is blitted every frame; the cards whose
+    # image changed are still reported for the dirty-rect display mode.
+    def __init__(self, layout, atlas):
+        self.cards = [Card(atlas, rect) for rect in layout.rects]
+
+    def relayout(self, layout, atlas):
+        # Same cards at new positions and size (the window was resized); flips in progress finish at once
+        for card, rect in zip(self.cards, layout.rects):
+            card.atlas = atlas
+            card.rect = pygame.Rect(rect)
+            card.face = card.target
+            card.flip_time = None
+            card.image = atlas.get(card.target)
+            card.changed = True
+
+    def draw(self, screen, faces, dt):
+        # faces: what each card should show (DOWN or its number). Returns the rects of cards that changed.
+        changed = []
+        for card, face in zip(self.cards, faces):
+            card.show(face)
+            card.update(dt)
+            if card.changed:
+                changed.append(card.rect)
+                card.changed = False
+        screen.blits([(card.image, card.rect) for card in self.cards], doreturn=False)
+        return changed
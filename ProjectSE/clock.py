@@ -0,0 +1,94 @@
+import heapq
+import time
+
+
+class ScheduledCall:
+    __slots__ = ('when', 'seq', 'callback', 'args', 'cancelled')
+
+    def __init__(self, when, seq, callback, args):
+        self.when = when
+        self.seq = seq
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def __lt__(self, other):
+        return (self.when, self.seq) < (other.when, other.seq)
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class Scheduler:
+    # Runs callbacks once enough game time has passed. Game time only moves when advance() is
+    # called, so the same calls happen at the same game times whatever the frame rate.
+    __slots__ = ('time', 'queue', 'seq')
+
+    def __init__(self):
+        self.time = 0.0
+        self.queue = []
+        self.seq = 0
+
+    def call_later(self, delay, callback, *args):
+        self.seq += 1
+        call = ScheduledCall(self.time + delay, self.seq, callback, args)
+        heapq.heappush(self.queue, call)
+        return call
+
+    def remaining(self, call):
+        return max(0.0, call.when - self.time)
+
+    def next_delay(self):
+        # Seconds until the next call is due, or None if nothing is scheduled
+        queue = self.queue
+        while queue and queue[0].cancelled:
+            heapq.heappop(queue)
+        return max(0.0, queue[0].when - self.time) if queue else None
+
+    def advance(self, dt):
+        # Move game time forward, running every call that falls due in order
+        end = self.time + dt
+        queue = self.queue
+        while queue and queue[0].when <= end:
+            call = heapq.heappop(queue)
+            if not call.cancelled:
+                self.time = call.when  # Callbacks see the time they were due at
+                call.callback(*call.args)
+        self.time = end
+
+    def clear(self):
+        self.queue.clear()
+
+
+class GameClock:
+    # Frame clock that reports the real time since the last frame. Drops to idle_fps after
+    # idle_after seconds without input, unless awake is set (during a round, where a player
+    # thinking it over still wants smooth animation); gameplay runs on the measured dt, so timing
+    # is unchanged either way.
+    def __init__(self, fps=60, idle_fps=15, idle_after=10.0):
+        import pygame  # Only the frame clock needs pygame; Scheduler stays usable headless
+
+        self.clock = pygame.time.Clock()
+        self.fps = fps
+        self.idle_fps = idle_fps
+        self.idle_after = idle_after
+        self.last_input = time.perf_counter()
+        self.awake = False
+        self.dt = 0.0
+        self.time = 0.0  # Game time since start
+
+    def poke(self):
+        # Call on input to leave idle mode
+        self.last_input = time.perf_counter()
+
+    @property
+    def idle(self):
+        return self.idle_fps and not self.awake and time.perf_counter() - self.last_input > self.idle_after
+
+    def tick(self):
+        self.dt = self.clock.tick(self.idle_fps if self.idle else self.fps) / 1000
+        self.time += self.dt
+        return self.dt
+
+    def get_fps(self):
+        return self.clock.get_fps()
@@ -0,0 +1,124 @@
+# Load test for many kiosk processes writing to one results database.
+#
+#   python dbload.py --kiosks 16 --games 500                   as fast as they can, shared-storage mode
+#   python dbload.py --kiosks 8 --rate 5 --db /mnt/share/t.db  5 saves a second per kiosk on a real share
+#   python dbload.py --kiosks 8 --lock 20                      also hold the write lock for 20 s mid-run
+#
+# Each kiosk is a process with its own ResultStore, saving games one at a time. Reports insert
+# throughput, save-to-commit latency and how many writes were retried or spooled, replays the
+# spools, then checks every game landed exactly once in game_results and user_stats.
+import argparse
+import multiprocessing
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from equations import OPERATIONS
+from profiler import percentile
+from results import ResultStore, BUSY_TIMEOUT, RETRIES
+
+MODES = ('EASY', 'MEDIUM', 'HARD')
+
+
+def kiosk(options):
+    # One kiosk process; returns its save-to-commit latencies and counters
+    number, args = options
+    store = ResultStore(args.db, args.batch_size, shared=not args.wal, busy_timeout=args.busy_timeout,
+                        retries=args.retries, spool_path=spool_path(args, number), verbose=False)
+    latencies = []
+    store.add_listener(lambda rows: latencies.extend(time.time() - row[3] for row in rows))
+    store.ready.wait()
+
+    rng = random.Random(number)
+    started = time.perf_counter()
+    for game in range(args.games):
+        attempts = {operation: (2, rng.randint(0, 2)) for operation in rng.sample(OPERATIONS, 2)}
+        store.save(f"kiosk{number}-player{rng.randrange(args.players)}", rng.choice(MODES), rng.randint(0, 30),
+                   attempts)
+        if args.rate:
+            delay = started + (game + 1) / args.rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+    store.close(timeout=600)
+    return latencies, store.retried, store.spooled, time.perf_counter() - started
+
+
+def spool_path(args, number):
+    return os.path.join(args.spool_dir, f"kiosk{number}.spool")
+
+
+def hold_lock(path, after, seconds):
+    # Another writer sitting on the database, e.g. a kiosk stalled mid-commit on the share
+    time.sleep(after)
+    conn = sqlite3.connect(path, timeout=60)
+    conn.execute('BEGIN EXCLUSIVE')
+    time.sleep(seconds)
+    conn.rollback()
+    conn.close()
+
+
+def check(path, expected):
+    # (rows, distinct keys, games counted in user_stats) for the load test's players
+    conn = sqlite3.connect(path)
+    rows, keys = conn.execute("SELECT COUNT(*), COUNT(DISTINCT result_key) FROM game_results "
+                              "WHERE username LIKE 'kiosk%'").fetchone()
+    games = conn.execute("SELECT COALESCE(SUM(games), 0) FROM user_stats WHERE username LIKE 'kiosk%'").fetchone()[0]
+    conn.close()
+    print(f"Check: {rows} rows, {keys} keys, {games} games in user_stats for {expected} saved -> "
+          f"{'OK' if rows == keys == games == expected else 'MISMATCH'}")
+    return rows == keys == games == expected
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Many kiosk processes saving results to one database")
+    parser.add_argument('--kiosks', type=int, default=8, help="writer processes")
+    parser.add_argument('--games', type=int, default=500, help="games each kiosk saves")
+    parser.add_argument('--rate', type=float, default=0, help="saves per second per kiosk (0 = as fast as possible)")
+    parser.add_argument('--players', type=int, default=20, help="distinct players per kiosk")
+    parser.add_argument('--db', help="database to write to (default: a new one in a temporary directory)")
+    parser.add_argument('--wal', action='store_true', help="use WAL like a single kiosk does (same machine only)")
+    parser.add_argument('--batch-size', type=int, default=100, help="rows per transaction at most")
+    parser.add_argument('--busy-timeout', type=float, default=BUSY_TIMEOUT)
+    parser.add_argument('--retries', type=int, default=RETRIES)
+    parser.add_argument('--lock', type=float, default=0, metavar='SECONDS',
+                        help="hold an exclusive lock for this long one second into the run")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='dbload-')
+    args.db = args.db or os.path.join(workdir, 'results.db')
+    args.spool_dir = workdir
+    ResultStore(args.db, shared=not args.wal, verbose=False).close()  # Schema in place before the kiosks race
+
+    blocker = None
+    if args.lock:
+        blocker = multiprocessing.Process(target=hold_lock, args=(args.db, 1.0, args.lock))
+        blocker.start()
+
+    started = time.perf_counter()
+    with multiprocessing.Pool(args.kiosks) as pool:
+        results = pool.map(kiosk, [(number, args) for number in range(args.kiosks)])
+    elapsed = time.perf_counter() - started
+    if blocker is not None:
+        blocker.join()
+
+    latencies = sorted(latency for result in results for latency in result[0])
+    retried = sum(result[1] for result in results)
+    spooled = sum(result[2] for result in results)
+    expected = args.kiosks * args.games
+    print(f"{args.kiosks} kiosks x {args.games} games ({'WAL' if args.wal else 'shared'} mode): "
+          f"{len(latencies)} rows committed in {elapsed:.2f} s ({len(latencies) / elapsed:.0f} rows/s)")
+    print(f"  save to commit p50/p95/p99/max {percentile(latencies, 50) * 1000:.1f}/"
+          f"{percentile(latencies, 95) * 1000:.1f}/{percentile(latencies, 99) * 1000:.1f}/"
+          f"{(latencies[-1] if latencies else 0) * 1000:.1f} ms")
+    print(f"  retried writes {retried}, spooled rows {spooled}")
+
+    # A kiosk replays its spool the next time it starts; do that now for every kiosk
+    for number in range(args.kiosks):
+        if os.path.exists(spool_path(args, number)) or os.path.exists(spool_path(args, number) + '.replaying'):
+            ResultStore(args.db, shared=not args.wal, spool_path=spool_path(args, number), verbose=False).close(600)
+
+    ok = check(args.db, expected)
+    print(f"Database: {args.db}")
+    raise SystemExit(0 if ok else 1)
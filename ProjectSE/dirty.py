@@ -0,0 +1,63 @@
+import pygame
+
+
+class DirtyRects:
+    # Collects the screen regions that changed this frame so only those are pushed to the display.
+    # When disabled, present() falls back to flipping the whole screen.
+    def __init__(self, size, enabled=False):
+        self.screen_rect = pygame.Rect((0, 0), size)
+        self.enabled = enabled
+        self.rects = []
+        self.full = True  # The first frame always goes out whole
+        self.drawn = {}  # key -> (value, rect) of what was last drawn there
+        self.ui_rects = []
+        self.pushed_area = 0  # Pixels sent to the display by the last present()
+
+    def mark(self, rect):
+        if rect is not None:
+            self.rects.append(pygame.Rect(rect))
+
+    def mark_all(self):
+        self.full = True
+
+    def mark_changed(self, key, value, rect):
+        # Mark rect if what is drawn at key differs from last frame, along with the area it used to cover
+        previous = self.drawn.get(key)
+        if previous is None or previous[0] != value:
+            if previous is not None:
+                self.mark(previous[1])
+            self.mark(rect)
+            self.drawn[key] = (value, pygame.Rect(rect))
+
+    def mark_ui(self, ui_manager):
+        # UI elements can change without telling us (hover, cursor blink), so push their area every
+        # frame, plus the area of anything that was visible last frame and has since gone
+        rects = [pygame.Rect(sprite.rect.topleft, sprite.image.get_size())
+                 for sprite in ui_manager.get_sprite_group().sprites()
+                 if sprite.visible and sprite.image is not None and sprite.image.get_width()]
+        self.rects.extend(rect for rect in self.ui_rects if rect not in rects)
+        self.rects.extend(rects)
+        self.ui_rects = rects
+
+    def present(self):
+        if not self.enabled or self.full:
+            pygame.display.flip()
+            self.pushed_area = self.screen_rect.w * self.screen_rect.h
+            self.full = False
+        elif self.rects:
+            rects = [rect.clip(self.screen_rect) for rect in self.rects]
+            pygame.display.update(rects)
+            self.pushed_area = sum(rect.w * rect.h for rect in rects)
+        else:
+            self.pushed_area = 0
+        self.rects = []
+
+    def resize(self, size):
+        self.screen_rect = pygame.Rect((0, 0), size)
+        self.ui_rects = []
+        self.reset()
+
+    def reset(self):
+        # Forget what was drawn, e.g. after the game state changes
+        self.drawn.clear()
+        self.mark_all()
@@ -0,0 +1,176 @@
+import random
+from clock import Scheduler
+from equations import SolutionIndex, TARGET_RANGES, OPERATIONS
+
+# Round length in seconds for each difficulty
+ROUND_TIMES = {
+    'EASY': 120,
+    'MEDIUM': 90,
+    'HARD': 20,
+}
+DEFAULT_ROUND_TIME = 30  # Used when the difficulty is not set
+
+CHECK_DELAY = 1.0  # Seconds both picked cards stay up before the answer is checked
+HIDE_DELAY = 1.0   # Seconds a wrong pair stays up before it is flipped back
+
+# Outcomes reported by tick()
+CORRECT = 'correct'
+WRONG = 'wrong'
+TIME_UP = 'time_up'
+
+
+def round_time(difficulty):
+    return ROUND_TIMES.get(difficulty, DEFAULT_ROUND_TIME)
+
+
+class GameEngine:
+    # Board, equation, scoring and timers for one game, with no pygame dependency
+    __slots__ = ('rng', 'rows', 'cols', 'difficulty', 'board_numbers', 'solution_index', 'revealed',
+                 'selected', 'equation', 'score', 'scheduler', 'check_call', 'hide_call', 'round_end',
+                 'outcomes', 'on_outcome', 'game_over', 'bank', 'tier', 'target_ranges', 'checked', 'right')
+
+    def __init__(self, rows=3, cols=4, rng=None, scheduler=None, on_outcome=None, bank=None):
+        # Many engines can share one scheduler (see server.py); on_outcome, if given, is called
+        # with each outcome as it happens instead of queueing it for tick(). With a PuzzleBank
+        # (see puzzlebank.py) for this board size, boards come from the bank instead of being dealt.
+        self.bank = bank
+        self.rng = rng if rng is not None else random.Random()
+        self.rows = rows
+        self.cols = cols
+        self.difficulty = ''
+        self.scheduler = scheduler if scheduler is not None else Scheduler()
+        self.on_outcome = on_outcome
+        self.check_call = None
+        self.hide_call = None
+        self.round_end = None
+        self.reset()
+
+    def reset(self):
+        self.stop()
+        self.tier = self.difficulty
+        self.target_ranges = TARGET_RANGES
+        self.new_board()
+        self.score = 0
+        self.checked = dict.fromkeys(OPERATIONS, 0)  # operation -> pairs checked against it
+        self.right = dict.fromkeys(OPERATIONS, 0)  # operation -> pairs that solved it
+        self.round_end = None  # Scheduled by start()
+        self.outcomes = []
+        self.game_over = False
+
+    def start(self, difficulty, duration=None, target_ranges=None, tier=None):
+        # duration overrides the difficulty's round length, target_ranges the equation ranges of
+        # dealt boards and tier the puzzle bank difficulty (see stats.py for where they come from)
+        self.difficulty = difficulty
+        self.tier = tier if tier is not None else difficulty
+        if duration is None:
+            duration = round_time(difficulty)
+        if target_ranges is not None:
+            self.target_ranges = target_ranges
+        if self.bank is not None or target_ranges is not None:
+            self.new_board()  # Swap the board dealt before the round's settings were known
+        self.round_end = self.scheduler.call_later(duration, self.time_up)
+
+    @property
+    def round_timer(self):
+        # Seconds left in the round, or None before start()
+        if self.round_end is None:
+            return None
+        return self.scheduler.remaining(self.round_end)
+
+    def generate_board_numbers(self):
+        randint = self.rng.randint
+        return [randint(1, 10) for _ in range(self.rows * self.cols)]
+
+    def new_board(self):
+        if self.bank is not None:
+            # A ready-made puzzle: nothing to deal or index
+            self.board_numbers, self.equation = self.bank.sample(self.rng, self.tier)
+            self.solution_index = None
+        else:
+            # Deal a new board and index every equation it can solve
+            self.board_numbers = self.generate_board_numbers()
+            self.solution_index = SolutionIndex(self.board_numbers, self.target_ranges)
+            while not self.solution_index:  # Only possible on small boards or with narrow target ranges
+                self.board_numbers = self.generate_board_numbers()
+                self.solution_index = SolutionIndex(self.board_numbers, self.target_ranges)
+            self.equation = self.solution_index.sample(self.rng)
+        self.revealed = [False] * (self.rows * self.cols)
+        self.selected = []  # (number, index) of the cards picked this turn
+        self.cancel_pending()
+
+    def select(self, index):
+        # Flip a card; returns True if the card was turned over
+        if self.game_over or len(self.selected) >= 2 or self.revealed[index]:
+            return False
+        self.revealed[index] = True
+        self.selected.append((self.board_numbers[index], index))
+        if len(self.selected) == 2:
+            self.check_call = self.scheduler.call_later(CHECK_DELAY, self.check_pair)
+        return True
+
+    def stop(self):
+        # Cancel every timer this engine has on the scheduler
+        if self.round_end is not None:
+            self.round_end.cancel()
+            self.round_end = None
+        self.cancel_pending()
+
+    def cancel_pending(self):
+        for call in (self.check_call, self.hide_call):
+            if call is not None:
+                call.cancel()
+        self.check_call = None
+        self.hide_call = None
+
+    def check_answer(self):
+        if len(self.selected) < 2:
+            return False
+
+        operation = self.equation.operation
+        self.checked[operation] += 1
+        if self.equation.is_solved_by(self.selected[0][0], self.selected[1][0]):
+            self.right[operation] += 1
+            self.score += 1
+            self.new_board()
+            return True
+
+        # Leave the wrong pair up for a moment
+        self.hide_call = self.scheduler.call_later(HIDE_DELAY, self.hide_pair)
+        return False
+
+    @property
+    def attempts(self):
+        # {operation: (pairs checked, pairs right)} for the operations tried this game
+        return {operation: (checked, self.right[operation])
+                for operation, checked in self.checked.items() if checked}
+
+    def report(self, outcome):
+        if self.on_outcome is not None:
+            self.on_outcome(outcome)
+        else:
+            self.outcomes.append(outcome)
+
+    def check_pair(self):
+        self.check_call = None
+        self.report(CORRECT if self.check_answer() else WRONG)
+
+    def hide_pair(self):
+        self.hide_call = None
+        for _, idx in self.selected:
+            self.revealed[idx] = False
+        self.selected = []
+
+    def time_up(self):
+        self.game_over = True
+        self.round_end = None
+        self.cancel_pending()
+        self.report(TIME_UP)
+
+    def tick(self, dt):
+        # Advance the game by dt seconds and return the outcomes that happened
+        if self.game_over:
+            return []
+        self.scheduler.advance(dt)
+        outcomes = self.outcomes
+        self.outcomes = []
+        return outcomes
@@ -0,0 +1,138 @@
+import random
+from bisect import bisect
+from collections import Counter
+
+# Operations in the order they are offered to the player
+OPERATIONS = ['+', '-', '*', '/']
+
+# Inclusive target range for each operation
+TARGET_RANGES = {
+    '+': (5, 20),
+    '-': (1, 10),
+    '*': (5, 100),
+    '/': (1, 10),
+}
+
+
+def apply_operation(operation, a, b):
+    # Returns the integer result of "a operation b", or None when it has no whole-number answer
+    if operation == '+':
+        return a + b
+    if operation == '-':
+        return a - b
+    if operation == '*':
+        return a * b
+    if b != 0 and a % b == 0:
+        return a // b
+    return None
+
+
+def pair_targets(a, b, ranges):
+    # (operation, result) for every operation whose result lands in its range; ranges follow OPERATIONS
+    targets = []
+    for operation, (low, high) in zip(OPERATIONS, ranges):
+        result = apply_operation(operation, a, b)
+        if result is not None and low <= result <= high:
+            targets.append((operation, result))
+    return tuple(targets)
+
+
+class Equation:
+    __slots__ = ('operation', 'target', 'pair')
+
+    def __init__(self, operation, target, pair):
+        self.operation = operation
+        self.target = target
+        self.pair = pair  # One (a, b) pair from the board that solves the equation
+
+    @property
+    def text(self):
+        return f"(_ {self.operation} _ = {self.target})"
+
+    def __str__(self):
+        return self.text
+
+    def __repr__(self):
+        return f"Equation({self.operation!r}, {self.target!r}, {self.pair!r})"
+
+    def is_solved_by(self, a, b):
+        # Addition, subtraction and multiplication accept the cards in either order,
+        # division expects first card / second card
+        if self.operation == '+':
+            return a + b == self.target
+        if self.operation == '-':
+            return abs(a - b) == self.target
+        if self.operation == '*':
+            return a * b == self.target
+        return apply_operation('/', a, b) == self.target
+
+
+class SolutionIndex:
+    # Every (operation, target) a board can reach, built once per board from a value -> count multiset
+    __slots__ = ('counts', 'by_operation', 'operations', 'weights')
+
+    # The index only depends on which values are on the board and which of them are there twice,
+    # so boards with the same signature share one (read-only) index. Simulations deal millions of boards.
+    cache = {}
+    pair_results = {}  # ranges -> {(a, b): ((operation, result), ...)} for the pairs seen so far
+    CACHE_SIZE = 65536
+
+    def __init__(self, board_numbers, target_ranges=TARGET_RANGES):
+        self.counts = Counter(board_numbers)
+        values = tuple(sorted(self.counts))
+        ranges = tuple(target_ranges[operation] for operation in OPERATIONS)
+        key = (values, tuple(value for value in values if self.counts[value] > 1), ranges)
+        cached = SolutionIndex.cache.get(key)
+        if cached is None:
+            if len(SolutionIndex.cache) >= SolutionIndex.CACHE_SIZE:
+                SolutionIndex.cache.clear()
+            cached = SolutionIndex.cache[key] = self.build(values, ranges)
+        self.by_operation, self.operations, self.weights = cached
+
+    def build(self, values, ranges):
+        pair_results = SolutionIndex.pair_results.setdefault(ranges, {})
+        solutions = {}
+        for a in values:
+            for b in values:
+                # A value can only be paired with itself if it is on the board twice
+                if a == b and self.counts[a] < 2:
+                    continue
+                results = pair_results.get((a, b))
+                if results is None:
+                    results = pair_results[a, b] = pair_targets(a, b, ranges)
+                for operation, result in results:
+                    solutions.setdefault(operation, {}).setdefault(result, []).append((a, b))
+
+        # operation -> list of (target, pairs) so sampling is two random picks
+        by_operation = {operation: list(targets.items()) for operation, targets in solutions.items()}
+        operations = [operation for operation in OPERATIONS if operation in by_operation]
+
+        # Equations used to be drawn by picking an operation and a target in its range and trying
+        # again until the board could solve it, so each reachable target of an operation came up in
+        # proportion to 1 / (size of the operation's range). Operations keep that mix: weighted by
+        # their reachable targets over their range size (cumulative, for bisect)
+        sizes = {operation: high - low + 1 for operation, (low, high) in zip(OPERATIONS, ranges)}
+        weights = []
+        total = 0.0
+        for operation in operations:
+            total += len(by_operation[operation]) / sizes[operation]
+            weights.append(total)
+        return by_operation, operations, weights
+
+    def __bool__(self):
+        return bool(self.operations)
+
+    def __len__(self):
+        return sum(len(targets) for targets in self.by_operation.values())
+
+    def targets(self, operation):
+        return [target for target, _ in self.by_operation.get(operation, [])]
+
+    def sample(self, rng=random):
+        # Pick an operation the board can reach (weighted, see build), then one of its targets and a solving pair
+        if not self.operations:
+            return None
+        weights = self.weights
+        operation = self.operations[bisect(weights, rng.random() * weights[-1])]
+        target, pairs = rng.choice(self.by_operation[operation])
+        return Equation(operation, target, rng.choice(pairs))
@@ -0,0 +1,90 @@
+import time
+import pygame
+import pygame_gui
+
+# pygame_gui event types the bus routes by the element that sent them
+UI_EVENT_TYPES = (
+    pygame_gui.UI_BUTTON_PRESSED,
+    pygame_gui.UI_TEXT_ENTRY_FINISHED,
+    pygame_gui.UI_TEXT_ENTRY_CHANGED,
+)
+
+
+class EventBus:
+    # Drains the pygame event queue once per frame and hands every event to the handlers
+    # subscribed to its type (or, for UI events, to its element) on the active state.
+    def __init__(self):
+        self.global_handlers = []  # Get every event, whatever the state
+        self.handlers = {}  # event type -> [(state, handler)]
+        self.ui_handlers = {}  # (ui event type, element) -> [(state, handler)]
+
+        self.drained_at = 0.0  # perf_counter time this frame's events were taken from the queue
+
+        # Stats for the last frame and running totals
+        self.frame_events = 0
+        self.frame_dispatched = 0
+        self.frame_latency = 0.0  # Longest time from draining an event to its handler finishing
+        self.total_events = 0
+        self.total_dispatched = 0
+        self.frames = 0
+        self.max_latency = 0.0
+
+    def subscribe_all(self, handler):
+        self.global_handlers.append(handler)
+
+    def subscribe(self, event_type, handler, state=None):
+        # state=None receives the event in every state
+        self.handlers.setdefault(event_type, []).append((state, handler))
+
+    def subscribe_ui(self, element, handler, state=None, event_type=pygame_gui.UI_BUTTON_PRESSED):
+        self.ui_handlers.setdefault((event_type, element), []).append((state, handler))
+
+    def unsubscribe_ui(self, element):
+        for key in [key for key in self.ui_handlers if key[1] is element]:
+            del self.ui_handlers[key]
+
+    def targets(self, event, state):
+        # pygame_gui also posts each UI event a second time as an old-style USEREVENT; only the
+        # new-style event types are routed
+        event_type = event.type
+        handlers = self.handlers.get(event_type, [])
+        if event_type in UI_EVENT_TYPES:
+            handlers = handlers + self.ui_handlers.get((event_type, getattr(event, 'ui_element', None)), [])
+        return [handler for handler_state, handler in handlers if handler_state is None or handler_state == state]
+
+    def dispatch(self, state):
+        # Run one frame's worth of events; state is a callable returning the active state name, so a
+        # handler that switches state changes who gets the following events
+        self.drained_at = drained_at = time.perf_counter()
+        events = pygame.event.get()
+        dispatched = 0
+        latency = 0.0
+
+        i = 0
+        while i < len(events):
+            event = events[i]
+            for handler in self.global_handlers:
+                handler(event)
+            for handler in self.targets(event, state()):
+                handler(event)
+                dispatched += 1
+                latency = max(latency, time.perf_counter() - drained_at)
+            i += 1
+
+            if i == len(events):
+                # UI elements post their events (and the old-style USEREVENT copies) while handling
+                # input; answer them this frame too
+                events.extend(pygame.event.get(UI_EVENT_TYPES + (pygame.USEREVENT,)))
+
+        self.frame_events = len(events)
+        self.frame_dispatched = dispatched
+        self.frame_latency = latency
+        self.total_events += len(events)
+        self.total_dispatched += dispatched
+        self.frames += 1
+        self.max_latency = max(self.max_latency, latency)
+        return events
+
+    def report(self):
+        return (f"{self.frames} frames, {self.total_events} events, {self.total_dispatched} dispatched, "
+                f"max input latency {self.max_latency * 1000:.2f} ms")
@@ -0,0 +1,137 @@
+# Export game_results for analysis, streaming so memory use doesn't grow with the table.
+#
+#   python export.py                                     game_data.db as CSV on stdout
+#   python export.py kiosk*.db --format jsonl -o all.jsonl
+#   python export.py kiosk*.db --mode HARD --state export_state.json -o new.csv
+#
+# With --state, each database only exports rows added since the last run with the same filters
+# (by rowid), and the state file is updated once the export has been written.
+import argparse
+import csv
+import json
+import os
+import pathlib
+import sqlite3
+import sys
+
+from results import DB_PATH
+
+FIELDS = ('source', 'rowid', 'username', 'mode', 'score', 'played_at')
+CHUNK = 1000  # Rows per cursor read
+
+
+def connect(path):
+    # Read-only, so exporting never creates, migrates or locks a kiosk database for writing
+    return sqlite3.connect(pathlib.Path(path).resolve().as_uri() + '?mode=ro', uri=True)
+
+
+def state_key(path, mode=None, user=None):
+    # Where a database's export got to is kept per filter set: a --mode HARD run moves past rows
+    # it leaves out, which a later run without the filter still has to export
+    filters = '&'.join(f"{name}={value}" for name, value in (('mode', mode), ('user', user)) if value is not None)
+    key = os.path.abspath(path)
+    return f"{key}?{filters}" if filters else key
+
+
+def iter_rows(conn, mode=None, user=None, after_rowid=0, chunk=CHUNK):
+    # (rowid, username, mode, score, played_at) in rowid order, read `chunk` rows at a time
+    columns = [row[1] for row in conn.execute('PRAGMA table_info(game_results)')]
+    played_at = 'played_at' if 'played_at' in columns else 'NULL'  # Databases from before played_at
+    query = f'SELECT rowid, username, mode, score, {played_at} FROM game_results WHERE rowid > ?'
+    params = [after_rowid]
+    if mode is not None:
+        query += ' AND mode = ?'
+        params.append(mode)
+    if user is not None:
+        query += ' AND username = ?'
+        params.append(user)
+    query += ' ORDER BY rowid'
+
+    cursor = conn.execute(query, params)
+    while True:
+        rows = cursor.fetchmany(chunk)
+        if not rows:
+            return
+        yield from rows
+
+
+def iter_databases(paths, state, mode=None, user=None, chunk=CHUNK):
+    # Rows from every database in turn, tagged with where they came from. Moves the state for
+    # the path and filters to the last rowid seen as it goes, whether or not that row passed them.
+    for path in paths:
+        key = state_key(path, mode, user)
+        conn = connect(path)
+        try:
+            last = conn.execute('SELECT MAX(rowid) FROM game_results').fetchone()[0] or 0
+            source = os.path.basename(path)
+            for row in iter_rows(conn, mode, user, state.get(key, 0), chunk):
+                if row[0] > last:
+                    break  # Written after the export started; the next run picks it up
+                yield (source,) + row
+            state[key] = max(state.get(key, 0), last)
+        finally:
+            conn.close()
+
+
+def write_csv(rows, out):
+    writer = csv.writer(out)
+    writer.writerow(FIELDS)
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+    return count
+
+
+def write_jsonl(rows, out):
+    count = 0
+    for row in rows:
+        out.write(json.dumps(dict(zip(FIELDS, row))) + '\n')
+        count += 1
+    return count
+
+
+WRITERS = {'csv': write_csv, 'jsonl': write_jsonl}
+
+
+def load_state(path):
+    if path is None or not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_state(path, state):
+    # Write then rename, so an interrupted run leaves the previous state intact
+    temp = path + '.tmp'
+    with open(temp, 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(temp, path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Export Math Mastery Flip results as CSV or JSON lines")
+    parser.add_argument('databases', nargs='*', default=[DB_PATH], help=f"databases to export (default {DB_PATH})")
+    parser.add_argument('--format', choices=WRITERS, default='csv')
+    parser.add_argument('-o', '--output', help="file to write (default stdout)")
+    parser.add_argument('--mode', help="only this difficulty")
+    parser.add_argument('--user', help="only this user")
+    parser.add_argument('--state', metavar='FILE', help="export only rows added since the last run with this file")
+    parser.add_argument('--chunk', type=int, default=CHUNK, help="rows per cursor read")
+    args = parser.parse_args()
+
+    state = load_state(args.state)
+    rows = iter_databases(args.databases, state, args.mode, args.user, args.chunk)
+    out = open(args.output, 'w', newline='') if args.output else sys.stdout
+    try:
+        count = WRITERS[args.format](rows, out)
+    except sqlite3.Error as e:
+        print(f"An error occurred: {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    if args.state:
+        save_state(args.state, state)
+    print(f"Exported {count} rows from {len(args.databases)} database(s)", file=sys.stderr)
@@ -0,0 +1,67 @@
+import argparse
+
+import pygame
+
+MAX_BOARD_SIZE = 20  # Largest supported number of rows or columns
+
+# Spacing of the original 3x4 board: 130 px cards on a 150 px pitch
+CARD_PITCH = 150
+CARD_GAP = 20
+
+
+def check_board_size(rows, cols):
+    if not (1 <= rows <= MAX_BOARD_SIZE and 1 <= cols <= MAX_BOARD_SIZE) or rows * cols < 2:
+        raise ValueError(f"Board must have at least 2 cards and at most {MAX_BOARD_SIZE}x{MAX_BOARD_SIZE}, "
+                         f"got {rows}x{cols}")
+
+
+class BoardLayout:
+    # Card geometry for a rows x cols board, worked out once. Cards keep the original 150 px
+    # pitch (times scale, for a scaled window) when they fit and shrink evenly when they don't;
+    # the board is centred in area.
+    def __init__(self, rows, cols, area, scale=1.0):
+        check_board_size(rows, cols)
+
+        self.rows = rows
+        self.cols = cols
+        self.pitch = min(round(CARD_PITCH * scale), area.width // cols, area.height // rows)
+        self.card_size = self.pitch - max(1, self.pitch * CARD_GAP // CARD_PITCH)
+        self.x = area.x + (area.width - cols * self.pitch) // 2
+        self.y = area.y + (area.height - rows * self.pitch) // 2
+
+        # Index j * cols + i is the card in column i, row j
+        self.rects = [pygame.Rect(self.x + i * self.pitch, self.y + j * self.pitch, self.card_size, self.card_size)
+                      for j in range(rows) for i in range(cols)]
+        self.bounds = pygame.Rect(self.x, self.y, cols * self.pitch, rows * self.pitch)
+
+    def __len__(self):
+        return self.rows * self.cols
+
+    def card_at(self, pos):
+        # Index of the card under pos, or None for the gaps and everything off the board
+        dx = pos[0] - self.x
+        dy = pos[1] - self.y
+        if dx < 0 or dy < 0:
+            return None
+        i, x_in = divmod(dx, self.pitch)
+        j, y_in = divmod(dy, self.pitch)
+        if i >= self.cols or j >= self.rows or x_in >= self.card_size or y_in >= self.card_size:
+            return None
+        return j * self.cols + i
+
+    def font_size(self, size):
+        # Scale a font size picked for the original 130 px cards to this layout
+        return max(12, size * self.card_size // (CARD_PITCH - CARD_GAP))
+
+
+def parse_board_size(text):
+    # "ROWSxCOLS" -> (rows, cols); an argparse type, so argparse shows the message as it is
+    try:
+        rows, cols = (int(part) for part in text.lower().split('x'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Board size should look like 3x4, got {text!r}")
+    try:
+        check_board_size(rows, cols)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+    return rows, cols
@@ -0,0 +1,115 @@
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from stats import STATS_QUERY, UserStats
+
+# Lookups run on the UI thread, so they give up after this many seconds rather than wait out another
+# kiosk's commit on a shared database (a rollback journal locks readers out while it writes); the
+# caller gets no answer, which isn't cached, so the next lookup tries again
+READ_TIMEOUT = 0.1
+
+
+def initialize_score_counts(conn):
+    # How many games each (mode, score) has, so a rank sums a few dozen distinct scores instead of
+    # counting every game above it. Filled from game_results once, then kept up by update_score_counts.
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'score_counts'").fetchone()
+    if exists:
+        return
+    conn.execute('''CREATE TABLE score_counts
+                    (mode TEXT NOT NULL, score INTEGER NOT NULL, games INTEGER NOT NULL,
+                     PRIMARY KEY (mode, score)) WITHOUT ROWID''')
+    conn.execute('''INSERT INTO score_counts (mode, score, games)
+                    SELECT mode, score, COUNT(*) FROM game_results
+                    WHERE mode IS NOT NULL AND score IS NOT NULL GROUP BY mode, score''')
+
+
+def update_score_counts(conn, rows):
+    # Count saved rows (username, mode, score, ...) in; runs inside the caller's transaction
+    conn.executemany('INSERT INTO score_counts (mode, score, games) VALUES (?, ?, 1) '
+                     'ON CONFLICT (mode, score) DO UPDATE SET games = games + 1',
+                     [(mode, score) for _, mode, score, *_ in rows if mode is not None and score is not None])
+
+
+class Leaderboard:
+    # Read side of game_results. Every query is answered from an index and cached until
+    # the ResultStore commits a row that could change it.
+    def __init__(self, result_store, cache_size=64, timeout=READ_TIMEOUT):
+        self.result_store = result_store
+        self.cache_size = cache_size
+        self.timeout = timeout
+        self.cache = OrderedDict()
+        self.generation = 0  # Bumped by every invalidate, so a query that raced one isn't cached
+        self.lock = threading.Lock()
+        self.conn = None
+        result_store.add_listener(self.invalidate)
+
+    def _connect(self):
+        if self.conn is None:
+            # The writer creates the table and indexes, which can take it a while on a busy database
+            if not self.result_store.ready.wait(self.timeout):
+                raise sqlite3.OperationalError("results database not set up yet")
+            self.conn = sqlite3.connect(self.result_store.path, timeout=self.timeout)
+        return self.conn
+
+    def _cached(self, key, query, params):
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                return self.cache[key]
+            generation = self.generation
+
+        try:
+            result = self._connect().execute(query, params).fetchall()
+        except sqlite3.Error as e:
+            print(f"An error occurred: {e}")
+            return []
+
+        with self.lock:
+            if self.generation == generation:  # Otherwise rows landed meanwhile and this may predate them
+                self.cache[key] = result
+                if len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+        return result
+
+    def invalidate(self, rows):
+        # Drop cached answers for the modes and users the new rows belong to
+        modes = {row[1] for row in rows}
+        users = {row[0] for row in rows}
+        with self.lock:
+            self.generation += 1
+            for key in list(self.cache):
+                kind, value = key[0], key[1]
+                if (kind in ('top', 'rank') and value in modes) or (kind in ('user', 'stats') and value in users):
+                    del self.cache[key]
+
+    def top(self, mode, limit=10):
+        # [(username, score), ...] best first; ties go to whoever got there first
+        return self._cached(('top', mode, limit),
+                            'SELECT username, score FROM game_results WHERE mode = ? '
+                            'ORDER BY score DESC, rowid LIMIT ?',
+                            (mode, limit))
+
+    def best_for_user(self, username):
+        # {mode: best score} for one player
+        rows = self._cached(('user', username),
+                            'SELECT mode, MAX(score) FROM game_results WHERE username = ? GROUP BY mode',
+                            (username,))
+        return dict(rows)
+
+    def user_stats(self, username):
+        # {mode: UserStats} for one player, read by primary key from user_stats (see stats.py)
+        rows = self._cached(('stats', username), STATS_QUERY, (username,))
+        return {row[0]: UserStats.from_row(row[1:]) for row in rows}
+
+    def rank(self, mode, score):
+        # Position a score takes on a mode's board (1 = best), or None if the lookup failed
+        rows = self._cached(('rank', mode, score),
+                            'SELECT COALESCE(SUM(games), 0) FROM score_counts WHERE mode = ? AND score > ?',
+                            (mode, score))
+        return rows[0][0] + 1 if rows else None
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
@@ -0,0 +1,149 @@
+# Load generator for server.py: many simulated players flipping random cards.
+#
+#   python loadgen.py --clients 2000 --duration 30                  against a server on localhost
+#   python loadgen.py --clients 2000 --duration 30 --spawn-server   start one in this process first
+#
+# Reports the round-trip time of flip requests and the server's tick stats.
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import tempfile
+import time
+
+from profiler import percentile
+from server import GameServer, DEFAULT_PORT, encode
+
+
+class Player:
+    # One connection playing rounds back to back until the deadline
+    def __init__(self, host, port, number, rate, board, difficulty, stats):
+        self.number = number
+        self.host = host
+        self.port = port
+        self.user = f"bot{number}"
+        self.rate = rate
+        self.board = board
+        self.difficulty = difficulty
+        self.stats = stats
+        self.rng = random.Random(number)
+        self.sent = []  # (op, send time) of start and flip requests still waiting for their reply
+        self.up = set()  # Cards this player thinks are face up
+
+    async def run(self, deadline, delay):
+        await asyncio.sleep(delay)  # Players arrive over the ramp-up rather than all at once
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        self.stats['connected'] += 1
+        self.start(writer)
+        receiving = asyncio.create_task(self.receive(reader, writer))
+
+        cards = self.board[0] * self.board[1]
+        await asyncio.sleep(self.rng.random() / self.rate)  # Spread the clients over the first interval
+        while time.perf_counter() < deadline and not receiving.done():
+            hidden = [card for card in range(cards) if card not in self.up]
+            if len(self.up) < 2 and hidden:
+                card = self.rng.choice(hidden)
+                self.up.add(card)
+                self.sent.append(('flip', time.perf_counter()))
+                writer.write(encode({'op': 'flip', 'card': card}))
+            await asyncio.sleep(1 / self.rate)
+
+        writer.write(encode({'op': 'quit'}))
+        await writer.drain()
+        try:
+            await receiving  # Raises if the server refused to start a round
+        finally:
+            writer.close()
+
+    def start(self, writer):
+        self.sent.append(('start', time.perf_counter()))
+        writer.write(encode({'op': 'start', 'user': self.user, 'difficulty': self.difficulty, 'board': self.board}))
+
+    async def receive(self, reader, writer):
+        stats = self.stats
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+            message = json.loads(line)
+            ev = message['ev']
+            if ev in ('round', 'flip', 'error'):
+                # Replies come in request order, one per start or flip
+                op, sent_at = self.sent.pop(0) if self.sent else (None, None)
+                if op == 'flip':
+                    stats['rtt'].append(time.perf_counter() - sent_at)
+                    stats[ev] += 1
+                elif ev == 'error':
+                    # Nothing this player does will work (a bad --difficulty or --board, say)
+                    raise RuntimeError(f"Server refused {op or 'a request'}: {message.get('message')}")
+            elif ev in ('correct', 'wrong'):
+                stats[ev] += 1
+                if ev == 'correct':
+                    self.up.clear()
+                else:
+                    asyncio.get_running_loop().call_later(message['hide_in'], self.up.clear)
+            elif ev == 'over':
+                stats['rounds'] += 1
+                self.up.clear()
+                self.start(writer)
+
+
+async def main(args):
+    stats = {'connected': 0, 'flip': 0, 'error': 0, 'correct': 0, 'wrong': 0, 'rounds': 0, 'rtt': []}
+    game_server = None
+    serving = None
+    port = args.port
+    if args.spawn_server:
+        game_server = GameServer(db_path=os.path.join(tempfile.mkdtemp(), 'loadgen.db'), seed=1)
+        started = asyncio.Event()
+        serving = asyncio.create_task(game_server.serve(args.host, 0, started, report=False))
+        await started.wait()
+        port = game_server.port
+
+    players = [Player(args.host, port, number, args.rate, args.board, args.difficulty, stats)
+               for number in range(args.clients)]
+    started = time.perf_counter()
+    deadline = started + args.ramp + args.duration
+    results = await asyncio.gather(*(player.run(deadline, args.ramp * player.number / args.clients)
+                                     for player in players), return_exceptions=True)
+    elapsed = time.perf_counter() - started
+    failures = [result for result in results if isinstance(result, Exception)]
+
+    rtt = sorted(stats['rtt'])
+    print(f"{args.clients} clients ({stats['connected']} connected, {len(failures)} failed) for {elapsed:.1f} s")
+    if failures:
+        print(f"  first failure: {failures[0]!r}")
+    print(f"  {len(rtt)} flips answered ({len(rtt) / elapsed:.0f}/s): {stats['flip']} flipped, {stats['error']} refused")
+    print(f"  {stats['correct']} correct, {stats['wrong']} wrong, {stats['rounds']} rounds over")
+    print("  flip round trip p50/p95/p99/max %.2f/%.2f/%.2f/%.2f ms" %
+          tuple(value * 1000 for value in (percentile(rtt, 50), percentile(rtt, 95), percentile(rtt, 99),
+                                           rtt[-1] if rtt else 0.0)))
+    if game_server is not None:
+        print("  server:", game_server.stats())
+        serving.cancel()
+        game_server.close()
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Load generator for the Math Mastery Flip server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--clients', type=int, default=1000)
+    parser.add_argument('--duration', type=float, default=20.0, help="seconds to play for")
+    parser.add_argument('--ramp', type=float, default=2.0, help="seconds over which the clients connect")
+    parser.add_argument('--rate', type=float, default=2.0, help="flips per second per client")
+    parser.add_argument('--board', type=lambda text: [int(part) for part in text.split('x')], default=[3, 4])
+    parser.add_argument('--difficulty', default='HARD')
+    parser.add_argument('--spawn-server', action='store_true', help="run the server in this process")
+    args = parser.parse_args()
+
+    # Every client is a socket, twice over when the server runs here too
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = min(hard, args.clients * 2 + 100)
+    if soft < wanted:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (wanted, hard))
+
+    raise SystemExit(asyncio.run(main(args)))
@@ -2,69 +2,69 @@ import pygame
 import pygame_gui.elements.ui_button as ui_button
 from pygame_gui.core import ObjectID
 import sys
-import math
 import pygame_gui
 import random
 import time
 import json
-import sqlite3
-
-# Function to initialize the database
-def initialize_database():
-    conn = sqlite3.connect('game_data.db')
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS game_results
-                 (username TEXT, mode TEXT, score INTEGER)''')
-    conn.commit()
-    conn.close()
-
-# Function to save game result
-def save_game_result(user_name, difficulty, final_score):
+import argparse
+from results import ResultStore
+from leaderboard import Leaderboard
+from textcache import OutlinedTextCache
+from dirty import DirtyRects
+from background import ScrollingBackground
+from clock import GameClock
+from events import EventBus
+from layout import BoardLayout, parse_board_size
+from engine import GameEngine, CORRECT, WRONG, TIME_UP, CHECK_DELAY
+from assets import AssetManager
+from audio import Audio
+from bindings import Observable, BoundLabel, BoundText
+from cards import CardAtlas, CardBoard, DOWN
+from profiler import FrameProfiler
+from puzzlebank import PuzzleBank
+from replay import Recorder
+from stats import ADAPTIVE, tune
+from viewport import Viewport, ScaledFont, parse_window_size, KEEP_SCALES
+
+# Loads every asset once and times startup up to the first interactive frame
+assets = AssetManager()
+
+
+def check_theme():
     try:
-        conn = sqlite3.connect('game_data.db')
-        c = conn.cursor()
-        c.execute('INSERT INTO game_results (USERNAME, MODE, SCORE) VALUES (?, ?, ?)',
-                  (user_name, difficulty, final_score))
-        conn.commit()
-        print("Data inserted successfully")
-    except sqlite3.Error as e:
-        print(f"An error occurred: {e}")
-    finally:
-        conn.close()
+        # Read JSON file
+        with open('quick_start.JSON') as f:
+            json.load(f)
 
+        print("JSON data loaded successfully")
 
-try:
-    # Read JSON file
-    with open('quick_start.JSON') as f:
-        data = json.load(f)
+    except FileNotFoundError:
+        print("Error: JSON file not found.")
+    except json.JSONDecodeError:
+        print("Error: Invalid JSON format.")
+    except Exception as e:
+        print("Error:", e)
 
-    # Example usage
-    print("JSON data loaded successfully:", data)
 
-except FileNotFoundError:
-    print("Error: JSON file not found.")
-except json.JSONDecodeError:
-    print("Error: Invalid JSON format.")
-except Exception as e:
-    print("Error:", e)
-
-
-# Initialize pygame
-pygame.init()
+# Initialize pygame; the mixer starts on the asset thread so opening the audio device doesn't delay the first frame
+assets.timed("pygame init", lambda: (pygame.display.init(), pygame.font.init()))
+assets.timed("quick_start.JSON", check_theme)
 
 # Define screen properties
 SCREENWIDTH, SCREENHEIGHT = 1200, 800
 FPS = 60
+RESIZE_SETTLE = 0.25  # Seconds a dragged window has to keep its size before everything is rebuilt for it
 pygame.display.set_caption("Math Mastery Flip")
 
-# Initialize display surface
-screen = pygame.display.set_mode((SCREENWIDTH, SCREENHEIGHT))
+# Initialize display surface; Game() reopens it resizable or fullscreen for the scalable mode
+screen = assets.timed("display", pygame.display.set_mode, (SCREENWIDTH, SCREENHEIGHT))
+
+# Everything is laid out on a SCREENWIDTH x SCREENHEIGHT canvas; the viewport maps it onto the window
+viewport = Viewport((SCREENWIDTH, SCREENHEIGHT), load_font=assets.load_font)
 
 # Load background image
-bg = pygame.image.load('BG3.png').convert()
-bg_width = bg.get_width()
-tiles = math.ceil(SCREENWIDTH / bg_width) + 1
-scroll = 0
+bg = assets.image('BG3.png')
+background = assets.timed("background strip", ScrollingBackground, bg, SCREENWIDTH, SCREENHEIGHT)  # Shared by every state
 
 # Define colors
 white = (255, 255, 255)
@@ -73,250 +73,402 @@ green2 = (30, 66, 37)
 black = (0, 0, 0)
 light_green = (110, 255, 105)
 
-# Title and Text
-title_font = pygame.font.Font('FontGame.ttf', 72)
-btn_font = pygame.font.Font('FontGame.ttf', 30)
-text_font = pygame.font.Font('Gamer.ttf', 60)
-number_font = pygame.font.Font(None, 36)  # Added font for numbers
+# Title and Text, sized for the canvas; .font is the font at the window's scale, loaded up front
+title_font = ScaledFont(viewport, 'FontGame.ttf', 72)
+btn_font = ScaledFont(viewport, 'FontGame.ttf', 30)
+text_font = ScaledFont(viewport, 'Gamer.ttf', 60)
 
 # Variables
 user_name = ''
 difficulty = ''
-rows = 3
+rows = 3  # Default board size, --board overrides it
 cols = 4
-selected_numbers = []
-delay_counter = 0  # Added delay counter
+board_area = pygame.Rect(130, 150, 1000, 550)  # Space between the menu bars the board is fitted into
 round_time_limit = 30  # Time limit for each round in seconds
 final_score = ''
+final_attempts = {}  # operation -> (pairs checked, pairs right) of the finished game
 
-# SFX variables
-btn_sfx = pygame.mixer.Sound("btnSFX.mp3")
-correct_sfx = pygame.mixer.Sound("correct.mp3")  # Load correct sound
-wrong_sfx = pygame.mixer.Sound("wrong.mp3")      # Load wrong sound
-time_up_sfx = pygame.mixer.Sound("wrong.mp3")  # Load time up sound
+# Observed copies of the session values; labels and readouts bound to them only update on a change
+user_value = Observable(user_name)
+mode_value = Observable(difficulty)
+final_score_value = Observable(final_score)
 
+# SFX, decoded on the asset thread; wrong and time up share one decode of wrong.mp3
+audio = Audio(assets)
+audio.add('button', "btnSFX.mp3", 'ui')
+audio.add('correct', "correct.mp3", 'feedback')
+audio.add('wrong', "wrong.mp3", 'feedback')
+audio.add('time_up', "wrong.mp3", 'alert')
+assets.load_in_background(audio.paths(), before=audio.init)
 
 
-def title_text(text, font, text_col, outline_col, x, y):
-    text_surf = font.render(text, True, outline_col)
-    screen.blit(text_surf, (x - 2, y - 2))
-    screen.blit(text_surf, (x + 2, y - 2))
-    screen.blit(text_surf, (x - 2, y + 2))
-    screen.blit(text_surf, (x + 2, y + 2))
 
-    img = font.render(text, True, text_col)
-    screen.blit(img, (x, y))
+# Outlined text is rendered once per (text, font, colours) and reused every frame
+TEXT_OUTLINE = 2  # Pixels on the canvas
+text_cache = OutlinedTextCache(outline=TEXT_OUTLINE)
+
+# Changed screen regions for the optional dirty-rect rendering mode
+dirty = DirtyRects((SCREENWIDTH, SCREENHEIGHT))
+
+
+def title_text(text, font, text_col, outline_col, x, y):
+    rect = text_cache.draw(screen, text, font.font, text_col, outline_col, *viewport.point((x, y)))
+    dirty.mark_changed((x, y), text, rect)
+    return rect
 
 def draw_text(text, font, color, outline_col, x, y):
-    text_surface = font.render(text, True, outline_col)
-    screen.blit(text_surface, (x - 2, y - 2))
-    screen.blit(text_surface, (x + 2, y - 2))
-    screen.blit(text_surface, (x - 2, y + 2))
-    screen.blit(text_surface, (x + 2, y + 2))
+    rect = text_cache.draw(screen, text, font.font, color, outline_col, *viewport.point((x, y)))
+    dirty.mark_changed((x, y), text, rect)
+    return rect
+
+def draw_readout(readout):
+    rect = readout.draw(screen)
+    dirty.mark_changed((readout.x, readout.y), readout.text, rect)
+    return rect
 
-    img = font.render(text, True, color)
-    screen.blit(img, (x, y))
 
 def draw_bg():
-    top_menu = pygame.draw.rect(screen, green2, [0, 0, SCREENWIDTH, 130], 0)
-    bottom_menu = pygame.draw.rect(screen, green2, [0, SCREENHEIGHT - 100, SCREENWIDTH, 130], 0)
+    top_menu = pygame.draw.rect(screen, green2, viewport.band(0, 130), 0)
+    bottom_menu = pygame.draw.rect(screen, green2, viewport.band(SCREENHEIGHT - 100, 100), 0)
 
 
 
 class Game:
-    def __init__(self):
-        self.ui_manager = pygame_gui.UIManager((SCREENWIDTH, SCREENHEIGHT), theme_path="quick_start.JSON")
+    def __init__(self, dirty_rects=False, fps=FPS, board_size=(rows, cols), profile=None, db_path='game_data.db',
+                 seed=None, record=None, clock=None, puzzles=None, adaptive=None, shared_db=False, window=None,
+                 fullscreen=False):
+        # Scalable mode: a resizable window of any size (or fullscreen, F11 toggles) showing the
+        # canvas scaled to fit; otherwise the fixed SCREENWIDTH x SCREENHEIGHT window
+        self.scalable = window is not None or fullscreen
+        self.display_flags = 0
+        if self.scalable:
+            self.display_flags = pygame.FULLSCREEN if fullscreen else pygame.RESIZABLE
+            self.open_display(window or (0, 0))
+            viewport.resize(screen.get_size())
+        self.pending_size = None  # Window size to adapt to once it has settled
+        self.pending_at = 0.0  # Game time it has to have settled by
+
+        with open("quick_start.JSON") as f:
+            self.theme = f.read()
+        self.ui_manager = assets.timed("UI theme", pygame_gui.UIManager, viewport.window, "quick_start.JSON")
         self.screen = screen
-        self.clock = pygame.time.Clock()
+        # Everything that moves runs on the real frame time from here (or recorded times when replaying)
+        self.clock = clock if clock is not None else GameClock(fps)
+        self.frame_count = 0
+
+        # Boards come from one seeded RNG so a recorded session can be replayed exactly
+        self.seed = seed if seed is not None else random.randrange(2 ** 32)
+        self.rng = random.Random(self.seed)
         self.gameStateManager = GameStateManager('start')
-        self.start = Start(self.screen, self.gameStateManager, self.ui_manager)
-        self.mode = Mode(self.screen, self.gameStateManager, self.ui_manager)
-        self.gameScreen = GameScreen(self.screen, self.gameStateManager, self.ui_manager)
-        self.gameResult = GameResult(self.screen, self.gameStateManager, self.ui_manager)
+        self.result_store = ResultStore(db_path, shared=shared_db)
+        self.leaderboard = Leaderboard(self.result_store)
+
+        # Events are drained once per frame and routed to the handlers of the active state
+        self.event_bus = EventBus()
+        self.event_bus.subscribe_all(self.handle_event)
+        self.event_bus.subscribe(pygame.QUIT, lambda event: self.quit())
+        if self.scalable:
+            self.event_bus.subscribe(pygame.VIDEORESIZE, self.handle_resize)
+            self.event_bus.subscribe(pygame.KEYDOWN, self.toggle_fullscreen)
+
+        # Optional recording of the seed, frame times and raw input for replay.py
+        self.recorder = Recorder(record, self.seed, board_size, puzzles,
+                                 viewport.window if self.scalable else None) if record else None
+        # Settings for ADAPTIVE rounds to use instead of the player's stats (replay.py passes the recorded ones)
+        self.adaptive = list(adaptive) if adaptive is not None else None
+        if self.recorder is not None:
+            self.event_bus.subscribe_all(self.recorder.record)
+
+        # Opt-in frame profiler; profile is the CSV path for per-frame samples, F3 shows the overlay
+        self.profiler = FrameProfiler(enabled=profile is not None, csv_path=profile)
+        if self.profiler.enabled:
+            self.profiler_font = assets.font(None, 22)
+            self.event_bus.subscribe(pygame.KEYDOWN, self.profiler.toggle_overlay)
+
+        self.start = Start(self.screen, self.gameStateManager, self.ui_manager, self.event_bus)
+        self.mode = Mode(self.screen, self.gameStateManager, self.ui_manager, self.event_bus)
+        self.gameScreen = GameScreen(self.screen, self.gameStateManager, self.ui_manager, self.event_bus, self.clock,
+                                     board_size, self.rng, self.load_puzzles(puzzles, board_size),
+                                     self.adaptive_settings)
+        self.gameResult = GameResult(self.screen, self.gameStateManager, self.ui_manager, self.event_bus,
+                                     self.leaderboard, self.quit)
         self.state = {'start': self.start, 'mode': self.mode, 'gameScreen': self.gameScreen, 'gameResult': self.gameResult}
 
+        # In dirty-rect mode the background holds still and only changed regions reach the display
+        dirty.enabled = dirty_rects
+        background.paused = dirty_rects
+        self.last_state = None
+        self.first_frame = True
+        if not viewport.identity:
+            self.apply_scale()
+            self.gameScreen.resize()
+
+    def open_display(self, size):
+        global screen
+        screen = pygame.display.set_mode(size, self.display_flags)
+
+    def handle_resize(self, event):
+        # Dragging a window edge sends a stream of these; the sizes it passes through are skipped,
+        # only the one it stops at gets fonts, card images and a background built for it
+        self.pending_size = event.size
+        self.pending_at = self.clock.time + RESIZE_SETTLE
+
+    def toggle_fullscreen(self, event):
+        if event.key == pygame.K_F11:
+            pygame.display.toggle_fullscreen()
+            self.pending_size = pygame.display.get_surface().get_size()
+            self.pending_at = self.clock.time
+
+    def resize(self, size):
+        # Rebuild everything that depends on the window's scale, once per size change
+        global screen
+        if pygame.display.get_surface().get_size() != tuple(size):
+            self.open_display(size)  # Drivers that don't resize the surface themselves, and replays
+        screen = self.screen = pygame.display.get_surface()
+        for state in self.state.values():
+            state.display = screen
+        if viewport.resize(screen.get_size()):
+            self.apply_scale()
+            self.gameScreen.resize()
+
+    def apply_scale(self):
+        self.ui_manager.set_window_resolution(viewport.window)
+        self.ui_manager.get_theme().update_theming(self.scaled_theme())
+        text_cache.outline = viewport.length(TEXT_OUTLINE)
+        text_cache.clear()
+        background.resize(*viewport.window, viewport.scale)
+        dirty.resize(viewport.window)
+
+    def scaled_theme(self):
+        # quick_start.JSON with its font sizes and border widths scaled to the window
+        theme = json.loads(self.theme)
+        fonts = self.ui_manager.get_theme().get_font_dictionary()
+        for block in theme.values():
+            font = block.get('font')
+            if font is not None:
+                # Scale the font pygame_gui really draws: it only reads sizes given as strings, and
+                # falls back to its default font at that font's own size for names it can't find
+                size = int(font['size']) if isinstance(font.get('size'), str) else fonts.default_font.size
+                if font.get('name') not in fonts.known_font_paths and not pygame.font.match_font(font.get('name', '')):
+                    font['name'], size = fonts.default_font.name, fonts.default_font.size
+                font['size'] = str(viewport.length(size))
+            misc = block.get('misc', {})
+            if 'border_width' in misc:
+                misc['border_width'] = str(viewport.length(int(misc['border_width'])))
+        return theme
+
+    def load_puzzles(self, path, board_size):
+        # The memory-mapped puzzle bank at path, if it is there and made for this board size
+        if not path:
+            return None
+        try:
+            bank = PuzzleBank(path)
+        except (OSError, ValueError) as e:
+            print("Error:", e)
+            return None
+        if (bank.rows, bank.cols) != tuple(board_size):
+            print(f"Error: {path} holds {bank.rows}x{bank.cols} boards; dealing boards instead")
+            bank.close()
+            return None
+        return bank
+
+    def adaptive_settings(self, username):
+        # (round time, target ranges, puzzle tier) for an ADAPTIVE round, from the player's stats rows
+        if self.adaptive is not None:
+            settings = self.adaptive.pop(0)
+        else:
+            settings = tune(self.leaderboard.user_stats(username))
+        if self.recorder is not None:
+            self.recorder.adaptive(settings)  # The stats live in the database, which a replay doesn't have
+        return settings
+
+    def handle_event(self, event):
+        self.clock.poke()  # Any input wakes the clock from idle
+        self.ui_manager.process_events(event)
+
+    def frame(self):
+        # One pass of the main loop: wait for the frame, handle input, update, draw and present
+        profiler = self.profiler
+
+        profiler.begin_frame()
+        dt = self.clock.tick()
+        self.frame_count += 1
+        profiler.lap('wait')
+        self.event_bus.dispatch(self.gameStateManager.get_State)
+        if self.pending_size is not None and self.clock.time >= self.pending_at:
+            self.resize(self.pending_size)
+            self.pending_size = None
+        profiler.lap('events')
+        self.ui_manager.update(dt)
+        profiler.lap('ui_update')
+        background.update(dt)
+        if self.gameStateManager.get_State() != self.last_state:
+            self.last_state = self.gameStateManager.get_State()
+            dirty.reset()  # A new screen goes out whole
+            self.clock.awake = self.last_state == "gameScreen"  # Full frame rate for the whole round
+        state = self.gameStateManager.get_State()
+        self.state[state].run()
+        profiler.lap('state')
+        self.ui_manager.draw_ui(screen)
+        dirty.mark_ui(self.ui_manager)
+        if profiler.show_overlay:
+            dirty.mark(profiler.draw_overlay(screen, self.profiler_font))
+        profiler.lap('draw_ui')
+        dirty.present()
+        profiler.lap('present')
+        profiler.end_frame(state)
+        if self.recorder is not None:
+            self.recorder.end_frame(dt)
+
+        if self.first_frame:
+            self.first_frame = False
+            assets.mark("first frame")
+            assets.report()
+
     def run(self):
         while True:
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    pygame.quit()
-                    sys.exit()
-                self.ui_manager.process_events(event)
-                if self.gameStateManager.get_State() == "gameScreen":
-                    self.state["gameScreen"].handle_events(event)
-            self.ui_manager.update(FPS / 1000)
-            self.state[self.gameStateManager.get_State()].run()
-            self.ui_manager.draw_ui(screen)
-            pygame.display.flip()
-            self.clock.tick(FPS)
-
+            self.frame()
+
+    def summary(self):
+        # Where the session ended up; a replay has to arrive at the same place
+        return {
+            'state': self.gameStateManager.get_State(),
+            'user': user_name,
+            'difficulty': difficulty,
+            'score': self.gameScreen.score,
+            'final_score': final_score,
+            'frames': self.frame_count,
+            'game_time': round(self.clock.time, 3),
+        }
+
+    def quit(self, result=None):
+        # Queue the final result, let the writer commit it, then shut pygame down
+        if result is not None:
+            self.result_store.save(*result)
+        self.result_store.close()
+        if self.recorder is not None:
+            self.recorder.close(self.summary(), self.clock.dt)
+        print("Input:", self.event_bus.report())
+        print("Audio:", audio.report())
+        self.profiler.close()
+        pygame.quit()
+        sys.exit()
 
 
 class GameScreen:
-    def __init__(self, display, gameStateManager, ui_manager):
+    def __init__(self, display, gameStateManager, ui_manager, event_bus, clock, board_size=(rows, cols), rng=None,
+                 bank=None, adaptive_settings=None):
         self.display = display
         self.gameStateManager = gameStateManager
         self.ui_manager = ui_manager
+        self.clock = clock
+        self.event_bus = event_bus
+
+        event_bus.subscribe(pygame.MOUSEBUTTONDOWN, self.handle_events, state="gameScreen")
 
         self.title_font = title_font
         self.text_font = text_font
 
 
-        self.user_label = pygame_gui.elements.UILabel(
+        self.user_label = viewport.place(pygame_gui.elements.UILabel(
             relative_rect=pygame.Rect((20, 20), (300, 50)),
             manager=self.ui_manager,
             text="",
             object_id="#user-label"
-        )
+        ))
 
         # Create the mode label
-        self.mode_label = pygame_gui.elements.UILabel(
+        self.mode_label = viewport.place(pygame_gui.elements.UILabel(
             relative_rect=pygame.Rect((20, 50), (300, 50)),
             manager=self.ui_manager,
             text="",
             object_id="#mode-label"
-        )
+        ))
 
         # Create the equation label
-        self.equation_label = pygame_gui.elements.UILabel(
+        self.equation_label = viewport.place(pygame_gui.elements.UILabel(
             relative_rect=pygame.Rect((500, 50), (300, 50)),
             manager=self.ui_manager,
             text="",
             object_id="#equation-label"
-        )
-
-        # Generate and store the random numbers once
-        self.board_numbers = self.generate_board_numbers()
-        self.revealed = [False] * (rows * cols)  # Added attribute to track revealed numbers
-        self.reveal_timer = 0  # Timer to track the delay
-
-        # Generate the first equation
-        self.current_equation, self.correct_answer = self.generate_equation()
-
-        self.round_timer = None  # Initialize round_timer to None
-        self.score = 0  # Initialize score
+        ))
+
+        # Board, equation, scoring and timers live in the engine
+        self.engine = GameEngine(*board_size, rng=rng, bank=bank)
+        self.pair_clicked_at = None  # perf_counter time of the click that turned the second card of a pair
+        self.adaptive_settings = adaptive_settings  # username -> (round time, target ranges, puzzle tier)
+
+        # Card geometry and the card images are worked out once for the board size and window
+        self.board_size = board_size
+        self.atlases = {}  # card size -> CardAtlas, for the last KEEP_SCALES sizes
+        self.layout = BoardLayout(*board_size, viewport.rect(board_area), viewport.scale)
+        self.cards = CardBoard(self.layout, self.atlas(self.layout.card_size))
+
+        # Labels and readouts follow their values rather than being re-set every frame
+        BoundLabel(self.user_label, user_value, "USER: {}")
+        BoundLabel(self.mode_label, mode_value, "MODE: {}")
+        self.equation_value = Observable(self.engine.equation)
+        self.seconds_value = Observable(0)  # Whole seconds left in the round
+        self.score_value = Observable(0)
+        readouts = [
+            (self.equation_value, "EQUATION: {}", (430, 35)),
+            (self.seconds_value, "TIME: {}", (990, 20)),
+            (self.score_value, "SCORE: {}", (990, 60)),
+        ]
+        self.readouts = [  # (readout, canvas position)
+            (BoundText(value, template, text_cache, self.text_font.font, white, green, *viewport.point(position)),
+             position)
+            for value, template, position in readouts
+        ]
+
+    def atlas(self, card_size):
+        # The card images for one card size; kept, so going back to the previous window size is free
+        atlas = self.atlases.get(card_size)
+        if atlas is None:
+            if len(self.atlases) >= KEEP_SCALES:
+                del self.atlases[next(iter(self.atlases))]
+            stroke = max(1, 5 * card_size // 130)
+            number_font = pygame.font.Font(None, self.layout.font_size(36))
+            atlas = self.atlases[card_size] = CardAtlas(card_size, stroke, number_font, light_green, green2, black)
+        return atlas
+
+    def resize(self):
+        # The window changed size: lay the board out again and re-render the readouts at the new scale
+        self.layout = BoardLayout(*self.board_size, viewport.rect(board_area), viewport.scale)
+        self.cards.relayout(self.layout, self.atlas(self.layout.card_size))
+        for readout, position in self.readouts:
+            readout.rescale(self.text_font.font, *viewport.point(position))
+
+    @property
+    def score(self):
+        return self.engine.score
+
+    @property
+    def current_equation(self):
+        return self.engine.equation
 
     def reset(self):
-        self.board_numbers = self.generate_board_numbers()
-        self.revealed = [False] * (rows * cols)  # Reset the revealed state
-        self.current_equation, self.correct_answer = self.generate_equation()
-        self.round_timer = None  # Initialize round_timer to None
-        self.score = 0  # Initialize score
+        self.engine.reset()
 
         self.user_label.show()
         self.mode_label.show()
 
-    def set_round_timer(self, difficulty):
-        if difficulty == 'EASY':
-            self.round_timer = 120  # 60 seconds for EASY
-        elif difficulty == 'MEDIUM':
-            self.round_timer = 90  # 45 seconds for MEDIUM
-        elif difficulty == 'HARD':
-            self.round_timer = 20  # 30 seconds for HARD
-        else:
-            self.round_timer = 30  # Default to 30 seconds if difficulty is not set
-
-    def generate_board_numbers(self):
-        return [random.randint(1, 10) for _ in range(rows * cols)]
-
-    def generate_equation(self):
-        operations = ['+', '-', '*', '/']
-        operation = random.choice(operations)
-
-        if operation == '+':
-            target = random.randint(5, 20)
-            valid_pairs = [(a, b) for a in self.board_numbers for b in self.board_numbers if a + b == target]
-        elif operation == '-':
-            target = random.randint(1, 10)
-            valid_pairs = [(a, b) for a in self.board_numbers for b in self.board_numbers if a - b == target]
-        elif operation == '*':
-            target = random.randint(5, 100)
-            valid_pairs = [(a, b) for a in self.board_numbers for b in self.board_numbers if a * b == target]
-        else:  # operation == '/'
-            target = random.randint(1, 10)
-            valid_pairs = [(a, b) for a in self.board_numbers for b in self.board_numbers if b != 0 and a % b == 0 and a / b == target]
-
-        if valid_pairs:
-            correct_pair = random.choice(valid_pairs)
-            equation_text = f"(_ {operation} _ = {target})"
-            return equation_text, correct_pair
-        else:
-            return self.generate_equation()
-
     def draw_board(self):
-        global rows
-        global cols
-
-        for i in range(cols):
-            for j in range(rows):
-                index = j * cols + i
-                piece = pygame.draw.rect(screen, light_green, [i * 150 + 330, j * 150 + 200, 130, 130], 0, 5)
-
-                if self.revealed[index]:
-                    random_number = self.board_numbers[index]
-                    text_surface = number_font.render(str(random_number), True, black)
-                    text_rect = text_surface.get_rect(center=(i * 150 + 395, j * 150 + 265))
-                    screen.blit(text_surface, text_rect)
-
-                    # Draw stroke effect for the revealed cards
-                    pygame.draw.rect(screen, green2, [i * 150 + 330, j * 150 + 200, 130, 130], 5)
-
-                # Draw stroke effect for the selected cards
-                for _, idx in selected_numbers:
-                    if idx == index:
-                        pygame.draw.rect(screen, green2, [i * 150 + 330, j * 150 + 200, 130, 130], 5)
+        # Cards flip towards what the engine says they show; only the ones that changed are redrawn
+        engine = self.engine
+        faces = [number if up else DOWN for number, up in zip(engine.board_numbers, engine.revealed)]
+        for rect in self.cards.draw(screen, faces, self.clock.dt):
+            dirty.mark(rect)
 
     def handle_events(self, event):
-        global delay_counter  # Added delay_counter to global scope
-
         if event.type == pygame.MOUSEBUTTONDOWN:
-            pos = pygame.mouse.get_pos()
-            for i in range(cols):
-                for j in range(rows):
-                    rect = pygame.Rect(i * 150 + 330, j * 150 + 200, 130, 130)
-                    if rect.collidepoint(pos):
-                        selected_number = self.board_numbers[j * cols + i]
-                        if len(selected_numbers) < 2 and not self.revealed[j * cols + i]:
-                            self.revealed[j * cols + i] = True  # Reveal the number
-                            selected_numbers.append((selected_number, j * cols + i))
-
-                        if len(selected_numbers) == 2:
-                            delay_counter = 60  # Set delay counter to 60 frames (1 second at 60 FPS)
-
-    def check_answer(self):
-        global selected_numbers
-        correct = False
-
-        if len(selected_numbers) < 2:
-            return
-
-        if "+" in self.current_equation:
-            correct = sum(num for num, idx in selected_numbers) == sum(self.correct_answer)
-        elif "-" in self.current_equation:
-            correct = abs(selected_numbers[0][0] - selected_numbers[1][0]) == abs(self.correct_answer[0] - self.correct_answer[1])
-        elif "*" in self.current_equation:
-            correct = selected_numbers[0][0] * selected_numbers[1][0] == self.correct_answer[0] * self.correct_answer[1]
-        elif "/" in self.current_equation:
-            if selected_numbers[1][0] != 0:  # Prevent division by zero
-                correct = selected_numbers[0][0] / selected_numbers[1][0] == self.correct_answer[0] / self.correct_answer[1]
-
-        if correct:
-            print("Correct!")
-            correct_sfx.play()  # Play correct sound
-            selected_numbers = []
-            self.score += 1  # Update score
-            self.board_numbers = self.generate_board_numbers()
-            self.revealed = [False] * (rows * cols)  # Reset the revealed state
-            self.current_equation, self.correct_answer = self.generate_equation()
-            # Do not reset the round timer
-        else:
-            print("Try again!")
-            wrong_sfx.play()  # Play wrong sound
-            self.reveal_timer = pygame.time.get_ticks()  # Set the timer for hiding the numbers
+            index = self.layout.card_at(event.pos)
+            if index is not None and self.engine.select(index) and len(self.engine.selected) == 2:
+                self.pair_clicked_at = self.event_bus.drained_at
 
     def display_result(self, final_score):
         # Create a green rectangle to display the result
-        result_rect = pygame.draw.rect(screen, green2, [200, 200, 800, 400], 0)
+        result_rect = pygame.draw.rect(screen, green2, viewport.rect((200, 200, 800, 400)), 0)
 
         # Print the stored values
         draw_text(f"Username: {user_name}", self.text_font, white, green, 300, 250)
@@ -326,204 +478,198 @@ class GameScreen:
         self.reset()
 
     def handle_time_up(self):
+        global final_score, final_attempts
+
         print("Time's Up!")
-        time_up_sfx.play()  # Play time up sound
-        self.board_numbers = self.generate_board_numbers()
-        self.revealed = [False] * (rows * cols)  # Reset the revealed state
-        self.current_equation, self.correct_answer = self.generate_equation()
-        self.round_timer = self.set_round_timer(difficulty)  # Reset the round timer
+        audio.play('time_up', self.event_bus.drained_at)
+        self.user_label.kill()
+        self.mode_label.kill()
+        final_score = self.engine.score
+        final_attempts = self.engine.attempts
+        final_score_value.set(final_score)
+        self.gameStateManager.set_State("gameResult")  # Change the game state to gameResult
+
+    def start_round(self):
+        if difficulty == ADAPTIVE and self.adaptive_settings is not None:
+            self.engine.start(difficulty, *self.adaptive_settings(user_name))
+        else:
+            self.engine.start(difficulty)
 
     def run(self):
-        global delay_counter  # Access delay_counter in run method
-        global selected_numbers
-
-        if self.round_timer is None:  # Only set the timer once when the game starts
-            self.set_round_timer(difficulty)
+        if self.engine.round_timer is None:  # Only set the timer once when the game starts
+            self.start_round()
 
         # bgloop
-        global scroll
-        for i in range(0, tiles):
-            self.display.blit(bg, (i * bg_width + scroll, 0))
-        scroll -= 1
-
-        if abs(scroll) > bg_width:
-            scroll = 0
-
-        self.user_label.set_text(f"USER: {user_name}")
-        self.mode_label.set_text(f"MODE: {difficulty}")
+        background.draw(self.display)
+
+        # Advance the engine and react to what happened this frame; the answer sound is due
+        # CHECK_DELAY after the click that completed the pair, and its latency is counted from then
+        answer_due = self.pair_clicked_at + CHECK_DELAY if self.pair_clicked_at is not None else None
+        for outcome in self.engine.tick(self.clock.dt):
+            if outcome == CORRECT:
+                print("Correct!")
+                audio.play('correct', answer_due)
+            elif outcome == WRONG:
+                print("Try again!")
+                audio.play('wrong', answer_due)
+            elif outcome == TIME_UP:
+                self.handle_time_up()
+                return
 
         draw_bg()
         self.draw_board()
-        draw_text(f"EQUATION: {self.current_equation}", self.text_font, white, green, 430, 35)
-
-        # Hide the numbers after a short delay if the pair is incorrect
-        if self.reveal_timer and pygame.time.get_ticks() - self.reveal_timer > 1000:
-            for _, idx in selected_numbers:
-                self.revealed[idx] = False  # Hide the numbers again
-            selected_numbers = []
-            self.reveal_timer = 0  # Reset the timer
-
-        # Check answer after delay_counter reaches 0
-        if delay_counter > 0:
-            delay_counter -= 1
-            if delay_counter == 0:
-                self.check_answer()
-
-        # Update and display the round timer
-        self.round_timer -= 1 / FPS
-        draw_text(f"TIME: {int(self.round_timer)}", self.text_font, white, green, 990, 20)
-        if self.round_timer <= 0:
-            self.round_timer = 0  # Ensure the timer doesn't go negative
-            self.user_label.kill()
-            self.mode_label.kill()
-            global final_score
-            final_score = self.score
-            self.gameStateManager.set_State("gameResult")  # Change the game state to gameResult
-            return
-
-        # Display the score
-        draw_text(f"SCORE: {self.score}", self.text_font, white, green, 990, 60)
-
-
 
-        pygame.display.update()
+        # Display the equation, the round timer and the score
+        self.equation_value.set(self.engine.equation)
+        self.seconds_value.set(int(self.engine.round_timer))
+        self.score_value.set(self.engine.score)
+        for readout, _ in self.readouts:
+            draw_readout(readout)
 
 
 class GameResult:
-    def __init__(self, display, gameStateManager, ui_manager):
+    def __init__(self, display, gameStateManager, ui_manager, event_bus, leaderboard, quit_game):
         self.display = display
         self.gameStateManager = gameStateManager
         self.ui_manager = ui_manager
+        self.leaderboard = leaderboard
+        self.quit_game = quit_game
 
         self.title_font = title_font
+        self.ranked = False
 
-        self.user = pygame_gui.elements.UILabel(
+        self.rank = viewport.place(pygame_gui.elements.UILabel(
+            relative_rect=pygame.Rect((450, 260), (300, 50)),
+            manager=self.ui_manager,
+            text="",
+            object_id="#rank-lbl"
+        ))
+
+        self.user = viewport.place(pygame_gui.elements.UILabel(
             relative_rect=pygame.Rect((450, 300), (300, 50)),
             manager=self.ui_manager,
             text="",
             object_id="#user-lbl"
-        )
+        ))
 
-        self.mode = pygame_gui.elements.UILabel(
+        self.mode = viewport.place(pygame_gui.elements.UILabel(
             relative_rect=pygame.Rect((450, 340), (300, 50)),
             manager=self.ui_manager,
             text="",
             object_id="#mode-lbl"
-        )
+        ))
 
-        self.score = pygame_gui.elements.UILabel(
+        self.score = viewport.place(pygame_gui.elements.UILabel(
             relative_rect=pygame.Rect((450, 380), (300, 50)),
             manager=self.ui_manager,
             text="",
             object_id="#score-lbl"
-        )
+        ))
 
-        self.exit_btn = ui_button.UIButton(
+        self.exit_btn = viewport.place(ui_button.UIButton(
             relative_rect=pygame.Rect((420, 450), (400, 50)),
             text='Quit Game',
             manager=self.ui_manager,
             object_id=ObjectID(object_id="#exit-button")
-        )
+        ))
 
         self.exit_btn.visible = False
 
-    def handle_button_events(self):
-        for event in pygame.event.get():
-            if event.type == pygame.USEREVENT:
-                if event.user_type == pygame_gui.UI_BUTTON_PRESSED:
-                    if event.ui_element == self.exit_btn:
-                        user_name = self.user
-                        difficulty = self.mode
-                        final_score = self.score
-                        save_game_result(user_name, difficulty, final_score)
-                        pygame.quit()
-                        pygame.quit()
+        BoundLabel(self.user, user_value, "USER: {}")
+        BoundLabel(self.mode, mode_value, "MODE: {}")
+        BoundLabel(self.score, final_score_value, "SCORE: {}")
+
+        event_bus.subscribe_ui(self.exit_btn, self.handle_button_events, state="gameResult")
 
+    def handle_button_events(self, event):
+        self.quit_game((user_name, difficulty, final_score, final_attempts))
+
+    def show_rank(self):
+        # Look up where this score lands once; the leaderboard answers from an index or its cache
+        rank = self.leaderboard.rank(difficulty, final_score)
+        if rank is not None:
+            self.rank.set_text(f"RANK: #{rank}")
+        self.ranked = True
 
     def run(self):
         if self.gameStateManager.get_State() == "gameResult":
             self.exit_btn.visible = True
-            self.handle_button_events()
-
-        self.user.set_text(f"USER: {user_name}")
-        self.mode.set_text(f"MODE: {difficulty}")
-        self.score.set_text(f"SCORE: {final_score}")
-
-        global scroll
-        for i in range(0, tiles):
-            self.display.blit(bg, (i * bg_width + scroll, 0))
-        scroll -= 1
+            if not self.ranked:
+                self.show_rank()
 
-        if abs(scroll) > bg_width:
-            scroll = 0
+        background.draw(self.display)
 
 
         title_text("Math Mastery Flip", self.title_font, white, green, 300, 50)
 
 class Mode:
-    def __init__(self, display, gameStateManager, ui_manager):
+    def __init__(self, display, gameStateManager, ui_manager, event_bus):
         self.display = display
         self.gameStateManager = gameStateManager
         self.ui_manager = ui_manager
+        self.event_bus = event_bus
 
         # Initialize fonts
         self.title_font = title_font
 
         # Create buttons
-        self.easy_btn = ui_button.UIButton(
+        self.easy_btn = viewport.place(ui_button.UIButton(
             relative_rect=pygame.Rect((450, 400), (300, 50)),
             text='EASY',
             manager=self.ui_manager,
             object_id=ObjectID(object_id="#easy-button")
-        )
-        self.medium_btn = ui_button.UIButton(
+        ))
+        self.medium_btn = viewport.place(ui_button.UIButton(
             relative_rect=pygame.Rect((450, 450), (300, 50)),
             text='MEDIUM',
             manager=self.ui_manager,
             object_id=ObjectID(object_id="#medium-button")
-        )
-        self.hard_btn = ui_button.UIButton(
+        ))
+        self.hard_btn = viewport.place(ui_button.UIButton(
             relative_rect=pygame.Rect((450, 500), (300, 50)),
             text='HARD',
             manager=self.ui_manager,
             object_id=ObjectID(object_id="#hard-button")
-        )
+        ))
+        self.adaptive_btn = viewport.place(ui_button.UIButton(
+            relative_rect=pygame.Rect((450, 550), (300, 50)),
+            text='ADAPTIVE',
+            manager=self.ui_manager,
+            object_id=ObjectID(object_id="#adaptive-button")
+        ))
 
         # Make buttons initially invisible
         self.easy_btn.visible = False
         self.medium_btn.visible = False
         self.hard_btn.visible = False
+        self.adaptive_btn.visible = False
 
+        for button in (self.easy_btn, self.medium_btn, self.hard_btn, self.adaptive_btn):
+            event_bus.subscribe_ui(button, self.handle_button_events, state="mode")
 
-    def handle_button_events(self):
+    def handle_button_events(self, event):
         global difficulty
-        global round_time_limit
-
-        for event in pygame.event.get():
-            if event.type == pygame.USEREVENT:
-                if event.user_type == pygame_gui.UI_BUTTON_PRESSED:
-                    if event.ui_element == self.easy_btn:
-                        self.gameStateManager.set_State("gameScreen")
-                        difficulty = 'EASY'
-                        btn_sfx.play()
-                        self.hide_buttons()
-                    elif event.ui_element == self.medium_btn:
-                        self.gameStateManager.set_State("gameScreen")
-                        difficulty = 'MEDIUM'
-                        btn_sfx.play()
-                        self.hide_buttons()
-                    elif event.ui_element == self.hard_btn:
-                        self.gameStateManager.set_State("gameScreen")
-                        difficulty = 'HARD'
-
-                        btn_sfx.play()
-                        self.hide_buttons()
+
+        if event.ui_element == self.easy_btn:
+            difficulty = 'EASY'
+        elif event.ui_element == self.medium_btn:
+            difficulty = 'MEDIUM'
+        elif event.ui_element == self.hard_btn:
+            difficulty = 'HARD'
+        elif event.ui_element == self.adaptive_btn:
+            difficulty = ADAPTIVE
+        mode_value.set(difficulty)
+
+        self.gameStateManager.set_State("gameScreen")
+        audio.play('button', self.event_bus.drained_at)
+        self.hide_buttons()
 
     def hide_buttons(self):
         # Hide all buttons
         self.easy_btn.visible = False
         self.medium_btn.visible = False
         self.hard_btn.visible = False
+        self.adaptive_btn.visible = False
 
     def run(self):
         if self.gameStateManager.get_State() == "mode":
@@ -531,26 +677,20 @@ class Mode:
             self.easy_btn.visible = True
             self.medium_btn.visible = True
             self.hard_btn.visible = True
-
-            self.handle_button_events()
+            self.adaptive_btn.visible = True
 
         # bgloop
-        global scroll
-        for i in range(0, tiles):
-            self.display.blit(bg, (i * bg_width + scroll, 0))
-        scroll -= 1
-
-        if abs(scroll) > bg_width:
-            scroll = 0
+        background.draw(self.display)
 
         # Render text with custom font
         title_text("Math Mastery Flip", self.title_font, white, green, 300, 50)
 
 class Start:
-    def __init__(self, display, gameStateManager, ui_manager):
+    def __init__(self, display, gameStateManager, ui_manager, event_bus):
         self.display = display
         self.gameStateManager = gameStateManager
         self.ui_manager = ui_manager
+        self.event_bus = event_bus
 
         self.title_font = title_font
 
@@ -559,46 +699,41 @@ class Start:
 
     def create_ui_elements(self):
         # Create a text box
-        self.text_entry = pygame_gui.elements.UITextEntryLine(
+        self.text_entry = viewport.place(pygame_gui.elements.UITextEntryLine(
             relative_rect=pygame.Rect((450, 350), (300, 50)),
             manager=self.ui_manager
-        )
+        ))
 
         # Create a button
-        self.start_btn = ui_button.UIButton(
+        self.start_btn = viewport.place(ui_button.UIButton(
             relative_rect=pygame.Rect((450, 430), (300, 50)),
             text='START',
             manager=self.ui_manager,
             object_id=ObjectID(object_id="#start-button")
-        )
+        ))
+
+        self.event_bus.subscribe_ui(self.start_btn, self.handle_button_events, state="start")
+
+    def handle_button_events(self, event):
+        global user_name
+
+        user_name = self.text_entry.get_text()
+        user_value.set(user_name)
+        if user_name == '':
+            self.gameStateManager.set_State("start")
+        else:
+            self.gameStateManager.set_State("mode")
+            self.event_bus.unsubscribe_ui(self.start_btn)
+            self.text_entry.kill()
+            self.start_btn.kill()
 
     def reset(self):
         # Recreate the UI elements
         self.create_ui_elements()
 
     def run(self):
-        global user_name
-
-        for event in pygame.event.get():
-            if event.type == pygame.USEREVENT:
-                if event.user_type == pygame_gui.UI_BUTTON_PRESSED:
-                    if event.ui_element == self.start_btn:
-                        user_name = self.text_entry.get_text()
-                        if user_name == '':
-                            self.gameStateManager.set_State("start")
-                        else:
-                            self.gameStateManager.set_State("mode")
-                            self.text_entry.kill()
-                            self.start_btn.kill()
-
         # bgloop
-        global scroll
-        for i in range(0, tiles):
-            self.display.blit(bg, (i * bg_width + scroll, 0))
-        scroll -= 1
-
-        if abs(scroll) > bg_width:
-            scroll = 0
+        background.draw(self.display)
 
         # Render text with custom font
         title_text("Math Mastery Flip", self.title_font, white, green, 300, 50)
@@ -616,5 +751,25 @@ class GameStateManager:
 
 
 if __name__ == '__main__':
-    game = Game()
+    parser = argparse.ArgumentParser(description="Math Mastery Flip")
+    parser.add_argument('--dirty-rects', action='store_true', help="only push changed screen regions to the display")
+    parser.add_argument('--fps', type=int, default=FPS, help="frame rate cap (gameplay timing does not depend on it)")
+    parser.add_argument('--board', type=parse_board_size, default=(rows, cols), metavar='ROWSxCOLS',
+                        help="board size, up to 20x20 (default 3x4)")
+    parser.add_argument('--profile', nargs='?', const='frame_profile.csv', metavar='CSV',
+                        help="time every frame (F3 toggles the overlay) and write the samples to CSV on exit")
+    parser.add_argument('--seed', type=int, help="seed for the boards (random by default)")
+    parser.add_argument('--record', metavar='FILE', help="record the session for replay.py")
+    parser.add_argument('--puzzles', metavar='FILE', help="take boards from a puzzle bank (see puzzlebank.py)")
+    parser.add_argument('--db', default='game_data.db', help="results database (default game_data.db)")
+    parser.add_argument('--shared-db', action='store_true',
+                        help="the database is on shared storage that other kiosks write to as well")
+    parser.add_argument('--window', type=parse_window_size, metavar='WIDTHxHEIGHT',
+                        help="resizable window of this size, with everything scaled to fit")
+    parser.add_argument('--fullscreen', action='store_true', help="fullscreen at the desktop resolution (F11 toggles)")
+    args = parser.parse_args()
+
+    game = Game(dirty_rects=args.dirty_rects, fps=args.fps, board_size=args.board, profile=args.profile,
+                seed=args.seed, record=args.record, puzzles=args.puzzles, db_path=args.db, shared_db=args.shared_db,
+                window=args.window, fullscreen=args.fullscreen)
     game.run()
\ No newline at end of file
@@ -0,0 +1,118 @@
+import csv
+import time
+from collections import deque
+
+import pygame
+
+# Parts of Game.run that get timed, in the order they happen
+PHASES = ('wait', 'events', 'ui_update', 'state', 'draw_ui', 'present')
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[k]
+
+
+class FrameProfiler:
+    # Opt-in timing of each phase of every frame. Keeps the last `window` frames for rolling
+    # p50/p95/p99 (per phase, and of each state's run()) and streams every frame to a CSV file.
+    def __init__(self, enabled=False, csv_path=None, window=600):
+        self.enabled = enabled
+        self.window = window
+        self.phases = {phase: deque(maxlen=window) for phase in PHASES}
+        self.frames = deque(maxlen=window)
+        self.states = {}  # state -> deque of its run() times
+        self.frame_count = 0
+        self.state = None
+        self.frame_start = 0.0
+        self.lap_start = 0.0
+        self.current = {}
+
+        self.show_overlay = False
+        self.overlay = None
+        self.overlay_updated = 0.0
+
+        self.csv_file = None
+        self.csv_writer = None
+        if enabled and csv_path:
+            self.csv_file = open(csv_path, 'w', newline='')
+            self.csv_writer = csv.writer(self.csv_file)
+            self.csv_writer.writerow(('frame', 'state', 'frame_ms') + tuple(f"{phase}_ms" for phase in PHASES))
+
+    def begin_frame(self):
+        if not self.enabled:
+            return
+        self.frame_start = self.lap_start = time.perf_counter()
+        self.current = {}
+
+    def lap(self, phase):
+        # Time since the previous lap (or the frame start) is charged to phase
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.current[phase] = self.current.get(phase, 0.0) + now - self.lap_start
+        self.lap_start = now
+
+    def end_frame(self, state):
+        if not self.enabled:
+            return
+        frame_time = time.perf_counter() - self.frame_start
+        self.frame_count += 1
+        self.state = state
+        self.frames.append(frame_time)
+        self.states.setdefault(state, deque(maxlen=self.window)).append(self.current.get('state', 0.0))
+        for phase in PHASES:
+            self.phases[phase].append(self.current.get(phase, 0.0))
+
+        if self.csv_writer is not None:
+            self.csv_writer.writerow((self.frame_count, state, f"{frame_time * 1000:.3f}") +
+                                     tuple(f"{self.current.get(phase, 0.0) * 1000:.3f}" for phase in PHASES))
+
+    def stats(self, samples):
+        # (p50, p95, p99) in milliseconds
+        ordered = sorted(samples)
+        return tuple(percentile(ordered, p) * 1000 for p in (50, 95, 99))
+
+    def lines(self):
+        lines = [f"frame {self.frame_count}  p50/p95/p99 ms"]
+        lines.append("%-10s %6.2f %6.2f %6.2f" % (('total',) + self.stats(self.frames)))
+        for phase in PHASES:
+            lines.append("%-10s %6.2f %6.2f %6.2f" % ((phase,) + self.stats(self.phases[phase])))
+        for state, samples in self.states.items():
+            lines.append("%-10s %6.2f %6.2f %6.2f" % ((state[:10],) + self.stats(samples)))  # run() only
+        return lines
+
+    def toggle_overlay(self, event=None):
+        if event is None or event.key == pygame.K_F3:
+            self.show_overlay = not self.show_overlay
+
+    def draw_overlay(self, surface, font):
+        # Re-render the overlay twice a second; in between it is a single blit
+        if not (self.enabled and self.show_overlay):
+            return None
+        now = time.perf_counter()
+        if self.overlay is None or now - self.overlay_updated > 0.5:
+            rendered = [font.render(line, True, (255, 255, 255)) for line in self.lines()]
+            height = sum(line.get_height() for line in rendered)
+            width = max(line.get_width() for line in rendered)
+            self.overlay = pygame.Surface((width + 12, height + 12))
+            self.overlay.set_alpha(200)
+            y = 6
+            for line in rendered:
+                self.overlay.blit(line, (6, y))
+                y += line.get_height()
+            self.overlay_updated = now
+        return surface.blit(self.overlay, (surface.get_width() - self.overlay.get_width() - 10, 140))
+
+    def close(self):
+        if not self.enabled:
+            return
+        print("Frame profile:")
+        for line in self.lines():
+            print("  " + line)
+        if self.csv_file is not None:
+            self.csv_file.close()
+            print(f"Per-frame samples written to {self.csv_file.name}")
+            self.csv_file = None
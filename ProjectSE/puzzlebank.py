@@ -0,0 +1,187 @@
+# Precomputed puzzles in a fixed-record binary file.
+#
+#   python puzzlebank.py generate -o puzzles.bin --count 120000 --board 3x4
+#   python puzzlebank.py info puzzles.bin
+#   python main.py --puzzles puzzles.bin
+#
+# Layout (little-endian):
+#   header   magic b'MMFP', version u16, rows u8, cols u8, record size u16, record count u32
+#   index    for each difficulty in TIERS and operation in OPERATIONS: first record u32, record count u32
+#   records  board (rows * cols x u8), operation index u8, target u16, solving pair a u8 and b u8
+# Records are grouped by (difficulty, operation) in index order, so picking one is two random
+# numbers and an unpack_from at a computed offset in the memory map.
+import mmap
+import random
+import struct
+
+from equations import OPERATIONS, Equation, SolutionIndex
+
+MAGIC = b'MMFP'
+VERSION = 1
+HEADER = struct.Struct('<4sHBBHI')
+INDEX_ENTRY = struct.Struct('<II')
+
+# Puzzle difficulty by how many card pairs on the board solve the equation
+TIERS = ('EASY', 'MEDIUM', 'HARD')
+
+
+def tier(solving_pairs):
+    if solving_pairs >= 4:
+        return 'EASY'
+    if solving_pairs >= 2:
+        return 'MEDIUM'
+    return 'HARD'
+
+
+def record_struct(rows, cols):
+    return struct.Struct(f'<{rows * cols}BBHBB')
+
+
+def count_solving_pairs(counts, operation, pairs):
+    # Card pairs on the board that answer the equation, from the board's value counts and the
+    # (a, b) value pairs SolutionIndex found for it. Addition and multiplication list both a, b and
+    # b, a, which are one pair of cards; subtraction only lists a > b, and division is ordered
+    count = 0
+    for a, b in pairs:
+        count += counts[a] * (counts[a] - 1) if a == b else counts[a] * counts[b]
+    if operation in ('+', '*'):
+        count //= 2
+    return count
+
+
+class PuzzleBank:
+    # Read-only view of a puzzle file; nothing is parsed beyond the header and index
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)  # ValueError if the file is empty
+        try:
+            self._read_index()
+        except ValueError:
+            self.data.close()
+            raise
+
+    def _read_index(self):
+        # Header and index, checked against the file's length so a cut-short or damaged file fails
+        # here with a ValueError rather than when a round starts
+        path = self.path
+        if len(self.data) < HEADER.size:
+            raise ValueError(f"{path} is too short to be a puzzle bank")
+        magic, version, self.rows, self.cols, record_size, self.count = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} puzzle bank")
+        self.record = record_struct(self.rows, self.cols)
+        if record_size != self.record.size:
+            raise ValueError(f"{path} has {record_size} byte records, expected {self.record.size}")
+        self.records_offset = HEADER.size + len(TIERS) * len(OPERATIONS) * INDEX_ENTRY.size
+        if len(self.data) < self.records_offset + self.count * self.record.size:
+            raise ValueError(f"{path} is cut short: {len(self.data)} bytes for {self.count} puzzles")
+
+        # (difficulty, operation) -> (first record, count), and the non-empty ranges per difficulty
+        self.ranges = {}
+        offset = HEADER.size
+        for difficulty in TIERS:
+            for operation in OPERATIONS:
+                first, count = INDEX_ENTRY.unpack_from(self.data, offset)
+                if first + count > self.count:
+                    raise ValueError(f"{path} indexes records {first}-{first + count} of {self.count}")
+                self.ranges[difficulty, operation] = first, count
+                offset += INDEX_ENTRY.size
+        self.by_difficulty = {difficulty: [self.ranges[difficulty, operation] for operation in OPERATIONS
+                                           if self.ranges[difficulty, operation][1]]
+                              for difficulty in TIERS}
+        self.all_ranges = [entry for entry in self.ranges.values() if entry[1]]
+        if not self.all_ranges:
+            raise ValueError(f"{path} has no puzzles")
+
+    def __len__(self):
+        return self.count
+
+    def get(self, number):
+        # (board numbers, Equation) of record `number`
+        values = self.record.unpack_from(self.data, self.records_offset + number * self.record.size)
+        cards = self.rows * self.cols
+        operation, target, a, b = values[cards:]
+        return list(values[:cards]), Equation(OPERATIONS[operation], target, (a, b))
+
+    def sample(self, rng=random, difficulty=None):
+        # A random puzzle of the difficulty (any, if it has none), operations equally likely
+        first, count = rng.choice(self.by_difficulty.get(difficulty) or self.all_ranges)
+        return self.get(first + rng.randrange(count))
+
+    def close(self):
+        self.data.close()
+
+
+def generate(path, count, rows=3, cols=4, seed=None):
+    # Deal boards like GameEngine does and file one equation per board into its (difficulty, operation)
+    # bucket until every bucket has count / 12 puzzles. Returns the number of boards dealt.
+    rng = random.Random(seed)
+    record = record_struct(rows, cols)
+    per_bucket = max(1, count // (len(TIERS) * len(OPERATIONS)))
+    buckets = {(difficulty, operation): bytearray() for difficulty in TIERS for operation in OPERATIONS}
+    filled = {key: 0 for key in buckets}
+    remaining = len(buckets)
+    boards = 0
+    stalled = 0
+
+    while remaining and stalled < 100000:  # Some buckets can't be filled on big boards; keep what there is
+        boards += 1
+        stalled += 1
+        board = [rng.randint(1, 10) for _ in range(rows * cols)]
+        index = SolutionIndex(board)
+        for operation in index.operations:
+            target, pairs = rng.choice(index.by_operation[operation])
+            key = (tier(count_solving_pairs(index.counts, operation, pairs)), operation)
+            if filled[key] < per_bucket:
+                buckets[key] += record.pack(*board, OPERATIONS.index(operation), target, *rng.choice(pairs))
+                filled[key] += 1
+                stalled = 0
+                if filled[key] == per_bucket:
+                    remaining -= 1
+
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, rows, cols, record.size, sum(filled.values())))
+        first = 0
+        for key in buckets:
+            f.write(INDEX_ENTRY.pack(first, filled[key]))
+            first += filled[key]
+        for key in buckets:
+            f.write(buckets[key])
+    return boards
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    from layout import parse_board_size
+
+    parser = argparse.ArgumentParser(description="Generate or inspect a Math Mastery Flip puzzle bank")
+    commands = parser.add_subparsers(dest='command', required=True)
+    gen = commands.add_parser('generate', help="write a new puzzle bank")
+    gen.add_argument('-o', '--output', default='puzzles.bin')
+    gen.add_argument('--count', type=int, default=120000, help="puzzles in total, split evenly over the tags")
+    gen.add_argument('--board', type=parse_board_size, default='3x4', help="ROWSxCOLS")
+    gen.add_argument('--seed', type=int)
+    info = commands.add_parser('info', help="show what a puzzle bank holds")
+    info.add_argument('path')
+    args = parser.parse_args()
+
+    if args.command == 'generate':
+        rows, cols = args.board
+        started = time.perf_counter()
+        boards = generate(args.output, args.count, rows, cols, args.seed)
+        print(f"Dealt {boards} boards in {time.perf_counter() - started:.1f} s")
+        args.path = args.output
+
+    bank = PuzzleBank(args.path)
+    print(f"{args.path}: {len(bank)} puzzles for {bank.rows}x{bank.cols} boards, {bank.record.size} bytes each")
+    for difficulty in TIERS:
+        print(f"  {difficulty:<7}" + ''.join(f" {operation} {bank.ranges[difficulty, operation][1]:7d}"
+                                            for operation in OPERATIONS))
+    started = time.perf_counter()
+    for _ in range(100000):
+        bank.sample(random, 'HARD')
+    print(f"  sample: {(time.perf_counter() - started) * 10:.2f} us per puzzle")
+    bank.close()
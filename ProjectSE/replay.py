@@ -0,0 +1,215 @@
+# Session recording and headless replay.
+#
+#   python main.py --record session.jsonl     play normally, recording the session
+#   python replay.py session.jsonl            replay it as fast as possible and check the result
+#
+# A recording is JSON lines: a header with the RNG seed, board size, puzzle bank and window size, one
+# line per frame ([dt] or [dt, events], dt in seconds exactly as the game saw it), the settings of each
+# ADAPTIVE round as it starts and, if the game was quit, a footer with the final state and score.
+import json
+import os
+import sys
+import time
+
+import pygame
+
+FORMAT_VERSION = 1
+
+
+def encode_event(event):
+    # Compact list form of the raw input events a session depends on, or None for anything else
+    if event.type == pygame.MOUSEMOTION:
+        return ['move', event.pos[0], event.pos[1]]
+    if event.type == pygame.MOUSEBUTTONDOWN:
+        return ['down', event.pos[0], event.pos[1], event.button]
+    if event.type == pygame.MOUSEBUTTONUP:
+        return ['up', event.pos[0], event.pos[1], event.button]
+    if event.type == pygame.KEYDOWN:
+        return ['key', event.key, event.mod, event.unicode, event.scancode]
+    if event.type == pygame.KEYUP:
+        return ['keyup', event.key, event.mod, event.scancode]
+    if event.type == pygame.TEXTINPUT:
+        return ['text', event.text]
+    if event.type == pygame.VIDEORESIZE:
+        return ['resize', event.w, event.h]
+    if event.type == pygame.QUIT:
+        return ['quit']
+    return None
+
+
+def decode_event(data):
+    kind = data[0]
+    if kind == 'move':
+        return pygame.event.Event(pygame.MOUSEMOTION, pos=(data[1], data[2]), rel=(0, 0), buttons=(0, 0, 0))
+    if kind == 'down':
+        return pygame.event.Event(pygame.MOUSEBUTTONDOWN, pos=(data[1], data[2]), button=data[3])
+    if kind == 'up':
+        return pygame.event.Event(pygame.MOUSEBUTTONUP, pos=(data[1], data[2]), button=data[3])
+    if kind == 'key':
+        return pygame.event.Event(pygame.KEYDOWN, key=data[1], mod=data[2], unicode=data[3], scancode=data[4])
+    if kind == 'keyup':
+        return pygame.event.Event(pygame.KEYUP, key=data[1], mod=data[2], scancode=data[3])
+    if kind == 'text':
+        return pygame.event.Event(pygame.TEXTINPUT, text=data[1])
+    if kind == 'resize':
+        return pygame.event.Event(pygame.VIDEORESIZE, size=(data[1], data[2]), w=data[1], h=data[2])
+    if kind == 'quit':
+        return pygame.event.Event(pygame.QUIT)
+    raise ValueError(f"Unknown event in recording: {data!r}")
+
+
+class Recorder:
+    # Writes the seed, every frame's dt and the raw input of a session as it is played
+    def __init__(self, path, seed, board_size, puzzles=None, window=None):
+        self.file = open(path, 'w')
+        self.frames = 0
+        self.events = []
+        self.motion = None  # Only the last mouse position of a frame matters
+        self.write({'version': FORMAT_VERSION, 'seed': seed, 'board': list(board_size), 'puzzles': puzzles,
+                    'window': list(window) if window else None})
+
+    def write(self, data):
+        self.file.write(json.dumps(data, separators=(',', ':')) + '\n')
+
+    def record(self, event):
+        encoded = encode_event(event)
+        if encoded is None:
+            return
+        if encoded[0] == 'move':
+            self.motion = encoded
+            return
+        if self.motion is not None:
+            self.events.append(self.motion)
+            self.motion = None
+        self.events.append(encoded)
+
+    def end_frame(self, dt):
+        if self.motion is not None:
+            self.events.append(self.motion)
+            self.motion = None
+        self.write([dt, self.events] if self.events else [dt])
+        self.events = []
+        self.frames += 1
+
+    def adaptive(self, settings):
+        # (round time, target ranges, puzzle tier) the player's stats gave an ADAPTIVE round
+        self.write({'adaptive': settings})
+
+    def close(self, summary, dt):
+        # Called from inside the frame that quit, so that frame's input is written first
+        if self.file is None:
+            return
+        self.end_frame(dt)
+        self.write({'end': summary})
+        self.file.close()
+        self.file = None
+
+
+class ReplayClock:
+    # Stands in for GameClock, handing out the recorded frame times without waiting
+    def __init__(self, frames):
+        self.frames = iter(frames)
+        self.awake = False
+        self.dt = 0.0
+        self.time = 0.0
+        self.events = []
+
+    def poke(self):
+        pass
+
+    def tick(self):
+        self.dt, self.events = next(self.frames)
+        self.time += self.dt
+        return self.dt
+
+    def get_fps(self):
+        return 0.0
+
+
+def load(path):
+    # (header, [(dt, events), ...], end summary or None); header['adaptive'] lists the ADAPTIVE round settings
+    frames = []
+    adaptive = []
+    header = None
+    end = None
+    with open(path) as f:
+        for line in f:
+            data = json.loads(line)
+            if isinstance(data, list):
+                frames.append((data[0], data[1] if len(data) > 1 else []))
+            elif 'end' in data:
+                end = data['end']
+            elif 'adaptive' in data:
+                duration, ranges, tier = data['adaptive']
+                adaptive.append((duration, {operation: tuple(bounds) for operation, bounds in ranges.items()}, tier))
+            else:
+                header = data
+    if header is None or header.get('version') != FORMAT_VERSION:
+        raise ValueError(f"{path} is not a version {FORMAT_VERSION} recording")
+    header['adaptive'] = adaptive
+    return header, frames, end
+
+
+def replay(path, profile=None, db_path=None):
+    # Play a recording back through the real Game states with no frame cap; returns (summary, expected)
+    import tempfile
+    import main
+
+    header, frames, expected = load(path)
+    clock = ReplayClock(frames)
+    if db_path is None:
+        db_path = os.path.join(tempfile.mkdtemp(), 'replay.db')
+
+    game = main.Game(board_size=tuple(header['board']), seed=header['seed'], clock=clock, profile=profile,
+                     db_path=db_path, puzzles=header.get('puzzles'), adaptive=header['adaptive'],
+                     window=header.get('window'))
+
+    # Each frame's events must be in the queue before the frame drains it, i.e. right after the tick
+    tick = clock.tick
+
+    def tick_and_post():
+        dt = tick()
+        for data in clock.events:
+            pygame.event.post(decode_event(data))
+        return dt
+
+    clock.tick = tick_and_post
+
+    try:
+        for _ in range(len(frames)):
+            game.frame()
+        game.quit()  # The recording stopped without quitting; shut down the same way
+    except SystemExit:
+        pass
+    return game.summary(), expected
+
+
+if __name__ == '__main__':
+    import argparse
+
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))  # main.py loads its assets from the working directory
+
+    parser = argparse.ArgumentParser(description="Replay a recorded Math Mastery Flip session headlessly")
+    parser.add_argument('recording', type=os.path.abspath)
+    parser.add_argument('--profile', nargs='?', const='frame_profile.csv', metavar='CSV',
+                        help="profile the replayed frames")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    summary, expected = replay(args.recording, args.profile)
+    elapsed = time.perf_counter() - started
+
+    print(f"Replayed {summary['frames']} frames ({summary['game_time']:.1f} s of play) in {elapsed:.2f} s")
+    print("Final:", summary)
+    if expected is None:
+        print("Recording has no end summary to check against")
+        sys.exit(0)
+
+    mismatches = {key: (expected[key], summary.get(key)) for key in expected if summary.get(key) != expected[key]}
+    if mismatches:
+        for key, (want, got) in mismatches.items():
+            print(f"MISMATCH {key}: recorded {want!r}, replayed {got!r}")
+        sys.exit(1)
+    print("Replay matches the recording")
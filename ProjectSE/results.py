@@ -0,0 +1,345 @@
+import json
+import os
+import queue
+import random
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from leaderboard import initialize_score_counts, update_score_counts
+from stats import initialize_stats, update_stats
+
+DB_PATH = 'game_data.db'
+
+_STOP = object()  # Queue marker that shuts the writer thread down
+
+# Several kiosks can write to one database. A write waits up to BUSY_TIMEOUT seconds for another
+# kiosk's lock, then is retried up to RETRIES times with jittered exponential backoff; rows that
+# still can't be written go to a local spool file and are written again later. Rows the database
+# refuses outright (a constraint they break) are written one at a time instead, so the rest of the
+# batch still lands, and the ones that fail go to a rejected file next to the spool.
+BUSY_TIMEOUT = 5.0
+RETRIES = 5
+BACKOFF = 0.05      # Seconds before the first retry, doubling each time
+MAX_BACKOFF = 2.0
+
+INSERT = ('INSERT OR IGNORE INTO game_results (USERNAME, MODE, SCORE, PLAYED_AT, RESULT_KEY) '
+          'VALUES (?, ?, ?, ?, ?)')
+
+
+def initialize_database(conn):
+    # Under the write lock, so kiosks starting together don't both try the same migration
+    conn.execute('BEGIN IMMEDIATE')
+    conn.execute('''CREATE TABLE IF NOT EXISTS game_results
+                    (id INTEGER PRIMARY KEY, username TEXT, mode TEXT, score INTEGER, played_at REAL,
+                     result_key TEXT)''')
+
+    # Databases from older versions only have (username, mode, score); their rows keep a NULL played_at
+    columns = [row[1] for row in conn.execute('PRAGMA table_info(game_results)')]
+    if 'played_at' not in columns:
+        conn.execute('ALTER TABLE game_results ADD COLUMN played_at REAL')
+    # Unique per saved game, so writing a row again (a retry or spool replay after a commit that did
+    # land) is a no-op; older rows keep a NULL key
+    if 'result_key' not in columns:
+        conn.execute('ALTER TABLE game_results ADD COLUMN result_key TEXT')
+    conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_results_key ON game_results (result_key)')
+
+    # Leaderboard lookups: top scores per mode and best scores per user
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_results_mode_score ON game_results (mode, score DESC)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_results_user_mode_score ON game_results (username, mode, score DESC)')
+
+    # Per-user, per-mode statistics (see stats.py) and games per score for ranks (see leaderboard.py)
+    initialize_stats(conn)
+    initialize_score_counts(conn)
+    conn.commit()
+
+
+class ResultStore:
+    # Saves game results on a background thread that keeps one SQLite connection open.
+    # save() only queues the row, so the UI thread never waits on the disk.
+    #
+    # shared=True is for a database several kiosk processes write to over shared storage: it uses
+    # a rollback journal, as WAL needs shared memory that doesn't work across machines. Either way,
+    # every write takes the lock up front, waits and retries when the database is busy, and spools
+    # rows it couldn't write to spool_path (local to this kiosk) until a later write gets through.
+    def __init__(self, path=DB_PATH, batch_size=100, shared=False, busy_timeout=BUSY_TIMEOUT, retries=RETRIES,
+                 spool_path=None, verbose=True):
+        self.path = path
+        self.batch_size = batch_size
+        self.shared = shared
+        self.busy_timeout = busy_timeout
+        self.retries = retries
+        if spool_path is None:
+            # Named for this machine, should the working directory be on the shared storage too
+            spool_path = f"{os.path.basename(path)}.{socket.gethostname()}.spool"
+        self.spool_path = spool_path
+        self.replay_path = self.spool_path + '.replaying'  # Spooled rows being written again
+        self.rejected_path = self.spool_path + '.rejected'  # Rows the database refused, kept to look at
+        self.verbose = verbose
+        self.queue = queue.Queue()
+        self.closed = False
+        self.ready = threading.Event()  # Set once the schema is in place (or the database was unreachable)
+        self.listeners = []  # Called from the writer thread with each committed batch
+        self.pending = []  # Rows the writer thread is working on
+        self.spool_lock = threading.Lock()
+        self.retried = 0  # Writes that had to be retried
+        self.spooled = 0  # Rows sent to the spool file
+        self.rejected = 0  # Rows sent to the rejected file
+        self.thread = threading.Thread(target=self._run, name='result-store', daemon=True)
+        self.thread.start()
+
+    def save(self, user_name, difficulty, final_score, attempts=None):
+        # attempts: {operation: (pairs checked, pairs right)} for the game, for the per-operation stats
+        if self.closed:
+            raise RuntimeError("ResultStore is closed")
+        if user_name is None or difficulty is None or final_score is None:
+            raise ValueError(f"Can't save a result without a user, mode and score, got "
+                             f"{(user_name, difficulty, final_score)!r}")
+        self.queue.put((user_name, difficulty, final_score, time.time(), attempts or {}, uuid.uuid4().hex))
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def flush(self, timeout=None):
+        # Block until everything queued so far has been committed (or spooled)
+        done = threading.Event()
+        self.queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout=2.0):
+        # Commit whatever is queued and stop the writer; returns False if it did not finish in time,
+        # in which case the rows it still had are spooled for the next run
+        if self.closed:
+            return True
+        self.closed = True
+        self.queue.put(_STOP)
+        self.thread.join(timeout)
+        if self.thread.is_alive():
+            print(f"Warning: result store still writing after {timeout}s")
+            # The writer may yet commit some of these too; their keys make the second write a no-op
+            rows = list(self.pending)
+            while True:
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if isinstance(item, tuple):
+                    rows.append(item)
+            self._spool(rows)
+            return False
+        return True
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout)
+        if self.shared:
+            conn.execute('PRAGMA journal_mode=DELETE')
+            conn.execute('PRAGMA synchronous=FULL')
+        else:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')  # WAL stays consistent, commits skip the fsync
+        try:
+            initialize_database(conn)
+        except sqlite3.Error:
+            conn.close()
+            raise
+        return conn
+
+    def _insert(self, conn, rows):
+        # One transaction for the batch; returns the rows that weren't already in the table, and no
+        # rejected rows: anything the database refuses fails the whole batch
+        inserted = []
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')  # Take the write lock now rather than failing to upgrade a read lock
+            for row in rows:
+                if conn.execute(INSERT, row[:4] + row[5:6]).rowcount:
+                    inserted.append(row)
+            update_stats(conn, inserted)  # Same transaction, so the stats never disagree with the results
+            update_score_counts(conn, inserted)
+        return inserted, []
+
+    def _insert_each(self, conn, rows):
+        # Like _insert, but each row in a savepoint of its own, so a row the database refuses is
+        # rolled back and returned as rejected while the others are committed
+        inserted = []
+        rejected = []
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            for row in rows:
+                conn.execute('SAVEPOINT result_row')
+                try:
+                    if conn.execute(INSERT, row[:4] + row[5:6]).rowcount:
+                        update_stats(conn, [row])
+                        update_score_counts(conn, [row])
+                        inserted.append(row)
+                except sqlite3.OperationalError:
+                    raise  # Busy or unreachable, not this row's fault: the batch is retried or spooled
+                except (sqlite3.Error, TypeError, ValueError, AttributeError) as e:
+                    conn.execute('ROLLBACK TO result_row')
+                    print(f"An error occurred: {e}; rejecting {row[:3]!r}")
+                    rejected.append(row)
+                conn.execute('RELEASE result_row')
+        return inserted, rejected
+
+    def _write(self, conn, rows):
+        # Write rows, retrying while the database is busy; returns False if they went to the spool
+        delay = BACKOFF
+        attempt = 0
+        insert = self._insert
+        while True:
+            try:
+                inserted, rejected = insert(conn, rows)
+                break
+            except sqlite3.OperationalError as e:
+                # Locked past the busy timeout, or the shared storage hiccuped
+                if attempt == self.retries:
+                    print(f"An error occurred: {e}; spooling {len(rows)} rows")
+                    self._spool(rows)
+                    return False
+                attempt += 1
+                self.retried += 1
+                time.sleep(random.uniform(0, delay))
+                delay = min(delay * 2, MAX_BACKOFF)
+            except (sqlite3.Error, TypeError, ValueError, AttributeError) as e:
+                # A row the database won't take; find it rather than hold the whole batch back
+                if insert == self._insert_each:
+                    print(f"An error occurred: {e}; spooling {len(rows)} rows")
+                    self._spool(rows)
+                    return False
+                print(f"An error occurred: {e}; writing {len(rows)} rows one at a time")
+                insert = self._insert_each
+
+        self._reject(rejected)
+        if self.verbose:
+            print(f"Data inserted successfully ({len(inserted)} rows)")
+        if inserted:
+            for listener in self.listeners:
+                listener(inserted)
+        return True
+
+    @contextmanager
+    def _locked_spool(self):
+        # The spool to ourselves: other threads wait on spool_lock, other processes on this machine
+        # using the same spool (several kiosks started from one directory) on a lock on <spool>.lock
+        with self.spool_lock, open(self.spool_path + '.lock', 'a') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                yield
+            else:
+                lock.seek(0)
+                msvcrt.locking(lock.fileno(), msvcrt.LK_LOCK, 1)
+                try:
+                    yield
+                finally:
+                    lock.seek(0)
+                    msvcrt.locking(lock.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def _spool(self, rows):
+        if not rows:
+            return
+        with self._locked_spool():
+            with open(self.spool_path, 'a') as f:
+                if f.tell():
+                    f.write('\n')  # Should the last write have been cut short, start clear of it
+                for row in rows:
+                    f.write(json.dumps(row) + '\n')
+            self.spooled += len(rows)
+
+    def _reject(self, rows):
+        # Rows that will never be written; kept out of the spool so they can't hold it up
+        if not rows:
+            return
+        with self._locked_spool():
+            with open(self.rejected_path, 'a') as f:
+                if f.tell():
+                    f.write('\n')
+                for row in rows:
+                    f.write(json.dumps(row) + '\n')
+            self.rejected += len(rows)
+        print(f"Warning: {len(rows)} rows the database refused were moved to {self.rejected_path}")
+
+    def _has_spool(self):
+        return os.path.exists(self.spool_path) or os.path.exists(self.replay_path)
+
+    def _replay_spool(self, conn):
+        # Write the spooled rows again as one batch. The spool is moved aside first, so rows spooled
+        # meanwhile start a new one, and the moved file only goes once its rows are committed or
+        # spooled again; one left by a run that was killed part way is picked up here next time.
+        if not self._has_spool():
+            return
+        with self._locked_spool():
+            if os.path.exists(self.spool_path):
+                if os.path.exists(self.replay_path):
+                    with open(self.spool_path) as f, open(self.replay_path, 'a') as replay:
+                        replay.write('\n' + f.read())  # Clear of a last line that may have been cut short
+                    os.remove(self.spool_path)
+                else:
+                    os.replace(self.spool_path, self.replay_path)
+            if not os.path.exists(self.replay_path):
+                return
+            rows = []
+            with open(self.replay_path) as f:
+                for line in f:
+                    try:
+                        rows.append(tuple(json.loads(line)))
+                    except (ValueError, TypeError):
+                        pass  # Blank, or cut short by the process being killed mid-write
+                size = os.fstat(f.fileno()).st_size
+        if rows:
+            print(f"Replaying {len(rows)} spooled rows")
+            self._write(conn, rows)  # Spools them again if the database is still unavailable
+        with self._locked_spool():
+            # Unless another process sharing the spool has finished it, or added rows to it since
+            if os.path.exists(self.replay_path) and os.path.getsize(self.replay_path) == size:
+                os.remove(self.replay_path)  # Rows written twice are no-ops thanks to their keys
+
+    def _run(self):
+        try:
+            conn = self._connect()
+        except sqlite3.Error as e:
+            print(f"An error occurred: {e}; results will be spooled")
+            conn = None
+        self.ready.set()
+        if conn is not None:
+            self._replay_spool(conn)
+        running = True
+
+        while running:
+            # Wait for one item, then take whatever else is already queued as the same batch
+            items = [self.queue.get()]
+            while len(items) < self.batch_size:
+                try:
+                    items.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            rows = [item for item in items if isinstance(item, tuple)]
+            if rows:
+                self.pending = rows
+                if conn is None:
+                    try:
+                        conn = self._connect()
+                    except sqlite3.Error:
+                        pass
+                if conn is None:
+                    self._spool(rows)
+                elif self._write(conn, rows) and self._has_spool():
+                    self._replay_spool(conn)  # The database is back; catch up on what failed before
+                self.pending = []
+
+            for item in items:
+                if isinstance(item, threading.Event):
+                    item.set()
+                elif item is _STOP:
+                    running = False
+
+        if conn is not None:
+            conn.close()
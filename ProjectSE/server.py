@@ -0,0 +1,231 @@
+# Headless game server: many independent games over TCP, one GameEngine per connection.
+#
+#   python server.py [--port 8765] [--tick-rate 30]
+#   python loadgen.py --clients 2000           (see loadgen.py)
+#
+# The protocol is one JSON object per line. Client -> server:
+#   {"op": "start", "user": "bob", "difficulty": "EASY", "board": [3, 4]}
+#   {"op": "flip", "card": 5}
+#   {"op": "state"}
+#   {"op": "quit"}
+# Server -> client: {"ev": "round" | "flip" | "correct" | "wrong" | "over" | "state" | "error", ...}
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import deque
+
+from clock import Scheduler
+from engine import GameEngine, CORRECT, WRONG, TIME_UP, HIDE_DELAY, ROUND_TIMES
+from layout import check_board_size
+from profiler import percentile
+from results import ResultStore, DB_PATH
+
+DEFAULT_PORT = 8765
+TICK_RATE = 30  # Scheduler ticks per second for all sessions together
+MAX_LINE = 4096  # Longest request accepted
+MAX_BUFFERED = 64 * 1024  # Drop clients that stop reading once this much output is queued for them
+STATS_INTERVAL = 10.0
+
+
+def encode(message):
+    return json.dumps(message, separators=(',', ':')).encode() + b'\n'
+
+
+class Session:
+    # One connected player: the engine holds the game, the rest is who and where to write
+    __slots__ = ('server', 'writer', 'engine', 'user', 'difficulty')
+
+    def __init__(self, server, writer):
+        self.server = server
+        self.writer = writer
+        self.engine = None
+        self.user = ''
+        self.difficulty = ''
+
+    def send(self, message):
+        writer = self.writer
+        if writer.is_closing():
+            return
+        if writer.transport.get_write_buffer_size() > MAX_BUFFERED:
+            writer.close()  # A client that can't keep up only costs memory
+            return
+        writer.write(encode(message))
+
+    def start(self, request):
+        difficulty = request.get('difficulty', 'EASY')
+        if difficulty not in ROUND_TIMES:
+            raise ValueError(f"Unknown difficulty {difficulty!r}")
+        rows, cols = request.get('board', (3, 4))
+        check_board_size(rows, cols)
+
+        self.user = str(request.get('user', ''))[:32]
+        self.difficulty = difficulty
+        if self.engine is None or (self.engine.rows, self.engine.cols) != (rows, cols):
+            if self.engine is not None:
+                self.engine.stop()  # Its round timer is on the shared scheduler
+            self.engine = GameEngine(rows, cols, rng=self.server.rng, scheduler=self.server.scheduler,
+                                     on_outcome=self.outcome)
+        else:
+            self.engine.reset()
+        self.engine.start(difficulty)
+        self.server.playing.add(self)
+        self.send({'ev': 'round', 'rows': rows, 'cols': cols, 'equation': self.engine.equation.text,
+                   'time': self.engine.round_timer, 'score': 0})
+
+    def flip(self, request):
+        engine = self.engine
+        if engine is None or engine.game_over:
+            raise ValueError("No round in progress")
+        card = request.get('card')
+        if not isinstance(card, int) or not 0 <= card < len(engine.board_numbers):
+            raise ValueError(f"No card {card!r}")
+        if not engine.select(card):
+            raise ValueError(f"Card {card} can't be flipped now")
+        self.send({'ev': 'flip', 'card': card, 'number': engine.board_numbers[card]})
+
+    def state(self, request):
+        engine = self.engine
+        if engine is None:
+            raise ValueError("No round started")
+        self.send({'ev': 'state', 'rows': engine.rows, 'cols': engine.cols, 'equation': engine.equation.text,
+                   'score': engine.score, 'time': engine.round_timer, 'over': engine.game_over,
+                   'cards': [number if up else None for number, up in zip(engine.board_numbers, engine.revealed)]})
+
+    def outcome(self, outcome):
+        # Called by the engine from inside the server's scheduler tick
+        engine = self.engine
+        if outcome == CORRECT:
+            self.send({'ev': 'correct', 'score': engine.score, 'equation': engine.equation.text})
+        elif outcome == WRONG:
+            self.send({'ev': 'wrong', 'hide_in': HIDE_DELAY})
+        elif outcome == TIME_UP:
+            self.server.finish(self)
+            self.send({'ev': 'over', 'score': engine.score})
+
+    def close(self):
+        if self.engine is not None:
+            self.engine.stop()  # So nothing fires for a closed connection
+
+
+class GameServer:
+    # Every session's engine runs on one shared scheduler, so a tick only costs as much as the
+    # timers that fall due in it, however many sessions are idle. Requests are handled as they arrive.
+    def __init__(self, tick_rate=TICK_RATE, db_path=DB_PATH, seed=None):
+        self.tick_rate = tick_rate
+        self.rng = random.Random(seed)  # Shared by every board; sessions never need their own
+        self.scheduler = Scheduler()
+        self.sessions = set()
+        self.playing = set()  # Sessions with a round running
+        self.result_store = ResultStore(db_path) if db_path else None
+        self.handlers = {'start': Session.start, 'flip': Session.flip, 'state': Session.state}
+
+        # Tick loop stats over the last STATS_INTERVAL
+        self.tick_times = deque(maxlen=int(tick_rate * STATS_INTERVAL))
+        self.lateness = deque(maxlen=int(tick_rate * STATS_INTERVAL))
+        self.requests = 0
+        self.rounds = 0
+
+    async def handle_client(self, reader, writer):
+        session = Session(self, writer)
+        self.sessions.add(session)
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ConnectionError, ValueError):  # ValueError: line longer than the limit
+                    break
+                if not line:
+                    break
+                self.requests += 1
+                try:
+                    request = json.loads(line)
+                    op = request.get('op')
+                    if op == 'quit':
+                        break
+                    handler = self.handlers.get(op)
+                    if handler is None:
+                        raise ValueError(f"Unknown op {op!r}")
+                    handler(session, request)
+                except (ValueError, TypeError, AttributeError) as e:
+                    session.send({'ev': 'error', 'message': str(e)})
+        finally:
+            self.sessions.discard(session)
+            self.playing.discard(session)
+            session.close()
+            writer.close()
+
+    def finish(self, session):
+        self.playing.discard(session)
+        self.rounds += 1
+        if self.result_store is not None and session.user:
+            self.result_store.save(session.user, session.difficulty, session.engine.score, session.engine.attempts)
+
+    async def tick_loop(self):
+        loop = asyncio.get_running_loop()
+        interval = 1 / self.tick_rate
+        last = next_tick = loop.time()
+        while True:
+            next_tick += interval
+            await asyncio.sleep(max(0.0, next_tick - loop.time()))
+            now = loop.time()
+            self.lateness.append(now - next_tick)
+            if now - next_tick > interval:
+                next_tick = now  # Fell behind; carry on from here rather than ticking in a burst
+            self.scheduler.advance(now - last)
+            last = now
+            self.tick_times.append(loop.time() - now)
+
+    def stats(self):
+        ticks = sorted(self.tick_times)
+        late = sorted(self.lateness)
+        return (f"{len(self.sessions)} sessions, {len(self.playing)} playing, {self.rounds} rounds finished, "
+                f"{self.requests} requests | tick p50/p99 {percentile(ticks, 50) * 1000:.2f}/"
+                f"{percentile(ticks, 99) * 1000:.2f} ms, late p50/p99 {percentile(late, 50) * 1000:.2f}/"
+                f"{percentile(late, 99) * 1000:.2f} ms")
+
+    async def stats_loop(self):
+        while True:
+            await asyncio.sleep(STATS_INTERVAL)
+            print(time.strftime('%H:%M:%S'), self.stats())
+
+    async def serve(self, host='127.0.0.1', port=DEFAULT_PORT, started=None, report=True):
+        # started, if given, is an asyncio.Event set once the socket is listening (port 0 picks a free one)
+        server = await asyncio.start_server(self.handle_client, host, port, limit=MAX_LINE, backlog=1024)
+        self.port = server.sockets[0].getsockname()[1]
+        tasks = [asyncio.create_task(self.tick_loop())]
+        if report:
+            tasks.append(asyncio.create_task(self.stats_loop()))
+            print(f"Serving on {host}:{self.port}")
+        if started is not None:
+            started.set()
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def close(self):
+        if self.result_store is not None:
+            self.result_store.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Math Mastery Flip game server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--tick-rate', type=int, default=TICK_RATE, help="engine ticks per second")
+    parser.add_argument('--db', default=DB_PATH, help="where finished rounds are saved ('' to not save)")
+    parser.add_argument('--seed', type=int, help="seed for the boards (random by default)")
+    args = parser.parse_args()
+
+    game_server = GameServer(args.tick_rate, args.db, args.seed)
+    try:
+        asyncio.run(game_server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(game_server.stats())
+        game_server.close()
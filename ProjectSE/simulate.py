@@ -0,0 +1,230 @@
+# Bot tournament for balancing round times and target ranges.
+#
+#   python simulate.py --games 100000                      every bot on every difficulty
+#   python simulate.py --bots memory --round-times HARD=30 try a longer HARD round
+#
+# Bots play full timed games on GameEngine in simulated time (no waiting, no pygame), spread
+# over a process pool. Prints score distributions per bot and difficulty, and how often and how
+# fast each operation's equations get solved.
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import time
+from collections import Counter
+
+from engine import GameEngine, ROUND_TIMES, round_time
+from equations import OPERATIONS
+
+THINK_TIME = 0.6  # Simulated seconds a bot takes per flip
+CHUNK = 500  # Games per pool task
+
+
+class RandomBot:
+    # Flips any face-down card
+    name = 'random'
+
+    def __init__(self, rng):
+        self.rng = rng
+
+    def new_board(self, engine):
+        pass
+
+    def saw(self, index, number):
+        pass
+
+    def hidden(self, engine):
+        return [index for index, up in enumerate(engine.revealed) if not up]
+
+    def choose(self, engine):
+        return self.rng.choice(self.hidden(engine))
+
+
+class MemoryBot(RandomBot):
+    # Remembers every card it has turned over on this board and plays a known answer as soon as it has one
+    name = 'memory'
+
+    def new_board(self, engine):
+        self.known = {}  # index -> number
+
+    def saw(self, index, number):
+        self.known[index] = number
+
+    def choose(self, engine):
+        equation = engine.equation
+        known = self.known
+        if engine.selected:
+            first, first_index = engine.selected[0]
+            for index, number in known.items():
+                if index != first_index and equation.is_solved_by(first, number):
+                    return index
+        else:
+            for i, a in known.items():
+                for j, b in known.items():
+                    if i != j and equation.is_solved_by(a, b):
+                        return i
+        unknown = [index for index in self.hidden(engine) if index not in known]
+        return self.rng.choice(unknown or self.hidden(engine))
+
+
+class OptimalBot(RandomBot):
+    # Sees the whole board and flips a solving pair straight away: the best score the timers allow
+    name = 'optimal'
+
+    def choose(self, engine):
+        a, b = engine.equation.pair
+        numbers = engine.board_numbers
+        if not engine.selected:
+            return numbers.index(a)
+        first_index = engine.selected[0][1]
+        return next(index for index, number in enumerate(numbers) if number == b and index != first_index)
+
+
+BOTS = {bot.name: bot for bot in (RandomBot, MemoryBot, OptimalBot)}
+
+
+def new_stats():
+    return {'games': 0, 'flips': 0, 'scores': Counter(), 'served': Counter(), 'solved': Counter(),
+            'solve_time': Counter()}
+
+
+def play_game(engine, bot, difficulty, duration, think_time, stats):
+    engine.reset()
+    engine.start(difficulty, duration)
+    scheduler = engine.scheduler
+    board = None
+    while not engine.game_over:
+        if engine.board_numbers is not board:
+            if board is not None:  # The last board was solved
+                stats['solved'][equation.operation] += 1
+                stats['solve_time'][equation.operation] += scheduler.time - shown
+            board = engine.board_numbers
+            equation = engine.equation
+            shown = scheduler.time
+            stats['served'][equation.operation] += 1
+            bot.new_board(engine)
+
+        if len(engine.selected) < 2:
+            index = bot.choose(engine)
+            engine.select(index)
+            bot.saw(index, board[index])
+            stats['flips'] += 1
+            engine.tick(think_time)
+        else:
+            engine.tick(scheduler.next_delay())  # Nothing to do until the pair is checked or hidden
+    stats['games'] += 1
+    stats['scores'][engine.score] += 1
+
+
+def run_chunk(task):
+    # One pool task: `games` games of one bot on one difficulty
+    bot_name, difficulty, duration, games, seed, board, think_time = task
+    rng = random.Random(seed)
+    engine = GameEngine(*board, rng=rng)
+    bot = BOTS[bot_name](rng)
+    stats = new_stats()
+    for _ in range(games):
+        play_game(engine, bot, difficulty, duration, think_time, stats)
+    return bot_name, difficulty, stats
+
+
+def merge(total, stats):
+    total['games'] += stats['games']
+    total['flips'] += stats['flips']
+    for key in ('scores', 'served', 'solved', 'solve_time'):
+        total[key].update(stats[key])
+
+
+def score_percentile(scores, p):
+    # p-th percentile of a score -> games histogram
+    wanted = p / 100 * (sum(scores.values()) - 1)
+    seen = 0
+    for score in sorted(scores):
+        seen += scores[score]
+        if seen > wanted:
+            return score
+    return 0
+
+
+def report(results, durations):
+    for (bot_name, difficulty), stats in results.items():
+        scores = stats['scores']
+        games = stats['games']
+        mean = sum(score * count for score, count in scores.items()) / games
+        print(f"\n{bot_name} / {difficulty} ({durations[difficulty]:g} s rounds): {games} games, "
+              f"{stats['flips'] / games:.1f} flips per game")
+        print(f"  score mean {mean:.2f}  p10 {score_percentile(scores, 10)}  p50 {score_percentile(scores, 50)}  "
+              f"p90 {score_percentile(scores, 90)}  max {max(scores)}")
+        print(f"  {'op':<3} {'served':>9} {'solved':>9} {'rate':>6} {'mean solve s':>13}")
+        for operation in OPERATIONS:
+            served = stats['served'][operation]
+            solved = stats['solved'][operation]
+            if not served:
+                continue
+            solve_time = stats['solve_time'][operation] / solved if solved else float('nan')
+            print(f"  {operation:<3} {served:9d} {solved:9d} {solved / served:6.1%} {solve_time:13.2f}")
+
+
+def parse_round_times(text):
+    # "HARD=30,EASY=100" -> {'HARD': 30.0, 'EASY': 100.0}
+    durations = {}
+    for part in text.split(','):
+        difficulty, _, seconds = part.partition('=')
+        durations[difficulty.strip().upper()] = float(seconds)
+    return durations
+
+
+if __name__ == '__main__':
+    from layout import parse_board_size
+
+    parser = argparse.ArgumentParser(description="Simulate bots playing Math Mastery Flip")
+    parser.add_argument('--games', type=int, default=10000, help="games per bot and difficulty")
+    parser.add_argument('--bots', default=','.join(BOTS), help="comma-separated: " + ', '.join(BOTS))
+    parser.add_argument('--difficulties', default=','.join(ROUND_TIMES))
+    parser.add_argument('--round-times', type=parse_round_times, default={},
+                        help="override round lengths, e.g. HARD=30,EASY=100")
+    parser.add_argument('--think-time', type=float, default=THINK_TIME, help="simulated seconds per flip")
+    parser.add_argument('--board', type=parse_board_size, default=(3, 4))
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="processes (default: all cores)")
+    parser.add_argument('--chunk', type=int, default=CHUNK, help="games per task")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', metavar='FILE', help="also write the results as JSON")
+    args = parser.parse_args()
+
+    bots = args.bots.split(',')
+    difficulties = [difficulty.upper() for difficulty in args.difficulties.split(',')]
+    for bot_name in bots:
+        if bot_name not in BOTS:
+            parser.error(f"unknown bot {bot_name!r}")
+    durations = {difficulty: args.round_times.get(difficulty, round_time(difficulty)) for difficulty in difficulties}
+
+    tasks = []
+    for bot_name in bots:
+        for difficulty in difficulties:
+            for start in range(0, args.games, args.chunk):
+                tasks.append((bot_name, difficulty, durations[difficulty], min(args.chunk, args.games - start),
+                              args.seed + len(tasks), args.board, args.think_time))
+
+    results = {(bot_name, difficulty): new_stats() for bot_name in bots for difficulty in difficulties}
+    total_games = args.games * len(results)
+    print(f"Playing {total_games} games in {len(tasks)} tasks on {args.workers} processes")
+    started = time.perf_counter()
+    done = 0
+    with multiprocessing.Pool(args.workers) as pool:
+        for bot_name, difficulty, stats in pool.imap_unordered(run_chunk, tasks):
+            merge(results[bot_name, difficulty], stats)
+            done += stats['games']
+            if done * 10 // total_games != (done - stats['games']) * 10 // total_games:
+                elapsed = time.perf_counter() - started
+                print(f"  {done}/{total_games} games, {done / elapsed:.0f} games/s")
+    elapsed = time.perf_counter() - started
+    print(f"Done in {elapsed:.1f} s ({total_games / elapsed:.0f} games/s)")
+
+    report(results, durations)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump([{'bot': bot_name, 'difficulty': difficulty, 'round_time': durations[difficulty], **stats}
+                       for (bot_name, difficulty), stats in results.items()], f, indent=2)
+        print(f"\nResults written to {args.json}")
@@ -0,0 +1,123 @@
+# Per-user, per-mode statistics kept up to date as results are saved, and the ADAPTIVE mode tuned from them.
+#
+# user_stats has one row per (username, mode): games played, best score, a rolling mean of the score
+# and, for each operation, how many pairs were checked and how many were right. ResultStore updates
+# it in the same transaction as the game_results insert, so reading a player's stats is a primary-key
+# lookup of a few rows however many games they have played.
+from equations import OPERATIONS, TARGET_RANGES
+
+ADAPTIVE = 'ADAPTIVE'
+
+MEAN_WEIGHT = 0.2  # Weight of the newest game in the rolling mean; roughly the last ten games count
+OPERATION_NAMES = {'+': 'add', '-': 'sub', '*': 'mul', '/': 'div'}  # Column prefixes
+
+# Adaptive rounds run at one of LEVELS levels per operation, set by the player's accuracy on it.
+# Levels are whole steps so only a handful of distinct target ranges ever reach SolutionIndex's caches.
+LEVELS = 5
+ADAPTIVE_RANGES = {  # operation: (target range at the lowest level, at the highest)
+    '+': ((2, 10), (10, 20)),
+    '-': ((1, 4), (4, 9)),
+    '*': ((1, 20), (20, 100)),
+    '/': ((1, 3), (2, 10)),
+}
+ADAPTIVE_TIMES = (90, 75, 60, 45, 30)  # Round length at each overall level
+LEVEL_TIERS = ('EASY', 'EASY', 'MEDIUM', 'HARD', 'HARD')  # Puzzle bank difficulty at each overall level
+TARGET_SCORE = 8  # Rolling ADAPTIVE mean that moves the round time a level shorter (half of it, a level longer)
+
+_COUNT_COLUMNS = [f'{name}_{kind}' for name in OPERATION_NAMES.values() for kind in ('attempts', 'correct')]
+
+_UPSERT = (f'INSERT INTO user_stats (username, mode, games, best, mean, updated_at, {", ".join(_COUNT_COLUMNS)}) '
+           f'VALUES (?, ?, 1, ?, ?, ?{", ?" * len(_COUNT_COLUMNS)}) '
+           'ON CONFLICT (username, mode) DO UPDATE SET games = games + 1, best = MAX(best, excluded.best), '
+           f'mean = mean + {MEAN_WEIGHT} * (excluded.mean - mean), updated_at = excluded.updated_at, '
+           + ', '.join(f'{column} = {column} + excluded.{column}' for column in _COUNT_COLUMNS))
+
+STATS_QUERY = f'SELECT mode, games, best, mean, {", ".join(_COUNT_COLUMNS)} FROM user_stats WHERE username = ?'
+
+
+def initialize_stats(conn):
+    # Create user_stats; a database that already has results gets it filled from them once
+    # (scores only, the per-operation counts start from zero)
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'user_stats'").fetchone()
+    if exists:
+        return
+    counts = ''.join(f', {column} INTEGER NOT NULL DEFAULT 0' for column in _COUNT_COLUMNS)
+    conn.execute(f'''CREATE TABLE user_stats
+                     (username TEXT NOT NULL, mode TEXT NOT NULL, games INTEGER NOT NULL, best INTEGER NOT NULL,
+                      mean REAL NOT NULL, updated_at REAL{counts}, PRIMARY KEY (username, mode)) WITHOUT ROWID''')
+    conn.execute('''INSERT INTO user_stats (username, mode, games, best, mean, updated_at)
+                    SELECT username, mode, COUNT(*), MAX(score), AVG(score), MAX(played_at) FROM game_results
+                    WHERE username IS NOT NULL AND mode IS NOT NULL AND score IS NOT NULL
+                    GROUP BY username, mode''')
+
+
+def update_stats(conn, rows):
+    # Fold saved rows (username, mode, score, played_at, attempts, ...) into user_stats; attempts is
+    # {operation: (pairs checked, pairs right)}. Runs inside the caller's transaction.
+    params = []
+    for username, mode, score, played_at, attempts, *_ in rows:
+        counts = []
+        for operation in OPERATION_NAMES:
+            counts.extend(attempts.get(operation, (0, 0)))
+        params.append((username, mode, score, score, played_at, *counts))
+    conn.executemany(_UPSERT, params)
+
+
+class UserStats:
+    # One user_stats row
+    __slots__ = ('games', 'best', 'mean', 'attempts')
+
+    def __init__(self, games, best, mean, attempts):
+        self.games = games
+        self.best = best
+        self.mean = mean
+        self.attempts = attempts  # operation -> (pairs checked, pairs right)
+
+    @classmethod
+    def from_row(cls, row):
+        # row as returned by STATS_QUERY, without the mode
+        games, best, mean = row[:3]
+        counts = row[3:]
+        attempts = {operation: (counts[2 * i], counts[2 * i + 1]) for i, operation in enumerate(OPERATION_NAMES)}
+        return cls(games, best, mean, attempts)
+
+    def accuracy(self, operation):
+        checked, right = self.attempts.get(operation, (0, 0))
+        return right / checked if checked else None
+
+
+def level(right, checked):
+    # Accuracy level 0..LEVELS-1; with no history the estimate starts at 50% (one level above the lowest)
+    accuracy = (right + 1) / (checked + 2)
+    return min(LEVELS - 1, max(0, int((accuracy - 0.4) * 2 * LEVELS)))
+
+
+def scale_range(operation, step):
+    (low0, high0), (low1, high1) = ADAPTIVE_RANGES[operation]
+    fraction = step / (LEVELS - 1)
+    return round(low0 + (low1 - low0) * fraction), round(high0 + (high1 - high0) * fraction)
+
+
+def tune(stats):
+    # (round time, target ranges, puzzle bank tier) for an ADAPTIVE round from {mode: UserStats}.
+    # Accuracy is pooled over every mode the player has played, at most one row per mode.
+    totals = {operation: [0, 0] for operation in OPERATIONS}
+    for row in stats.values():
+        for operation, (checked, right) in row.attempts.items():
+            totals[operation][0] += checked
+            totals[operation][1] += right
+
+    ranges = dict(TARGET_RANGES)
+    for operation in ADAPTIVE_RANGES:
+        checked, right = totals[operation]
+        ranges[operation] = scale_range(operation, level(right, checked))
+
+    overall = level(sum(right for _, right in totals.values()), sum(checked for checked, _ in totals.values()))
+    adaptive = stats.get(ADAPTIVE)
+    if adaptive is not None:
+        # Keep the round about as long as the player needs to land TARGET_SCORE pairs
+        if adaptive.mean >= TARGET_SCORE:
+            overall = min(LEVELS - 1, overall + 1)
+        elif adaptive.mean < TARGET_SCORE / 2:
+            overall = max(0, overall - 1)
+    return ADAPTIVE_TIMES[overall], ranges, LEVEL_TIERS[overall]
@@ -0,0 +1,38 @@
+import random
+from collections import Counter
+
+from equations import OPERATIONS, TARGET_RANGES, SolutionIndex
+
+
+def test_sampled_equations_are_solvable():
+    rng = random.Random(7)
+    for _ in range(500):
+        board = [rng.randint(1, 10) for _ in range(12)]
+        index = SolutionIndex(board)
+        equation = index.sample(rng)
+        a, b = equation.pair
+        assert equation.is_solved_by(a, b)
+        assert Counter(board)[a] >= (2 if a == b else 1) and b in board
+
+
+def test_unsolvable_board_samples_nothing():
+    index = SolutionIndex([1, 1], {'+': (5, 20), '-': (1, 10), '*': (5, 100), '/': (2, 10)})
+    assert not index
+    assert index.sample(random.Random(0)) is None
+
+
+def test_operations_weighted_like_drawing_a_target_in_range():
+    # Each operation counts as (reachable targets) / (targets in its range), as if a target were
+    # drawn from the whole range and redrawn until the board could make it
+    index = SolutionIndex([1, 2, 3, 4, 5, 6, 7, 8, 9, 10])
+    shares = [len(index.targets(operation)) / (TARGET_RANGES[operation][1] - TARGET_RANGES[operation][0] + 1)
+              for operation in OPERATIONS]
+    previous = 0.0
+    for weight, share in zip(index.weights, shares):
+        assert abs(weight - previous - share) < 1e-9
+        previous = weight
+
+    rng = random.Random(1)
+    drawn = Counter(index.sample(rng).operation for _ in range(20000))
+    for operation, share in zip(OPERATIONS, shares):
+        assert abs(drawn[operation] / 20000 - share / sum(shares)) < 0.02
@@ -0,0 +1,34 @@
+import sqlite3
+
+from export import iter_databases
+
+
+def make_db(path, rows):
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE game_results (id INTEGER PRIMARY KEY, username TEXT, mode TEXT, score INTEGER, '
+                 'played_at REAL)')
+    conn.executemany('INSERT INTO game_results (username, mode, score, played_at) VALUES (?, ?, ?, 0)', rows)
+    conn.commit()
+    conn.close()
+
+
+def exported(paths, state, mode=None, user=None):
+    return [(row[2], row[3], row[4]) for row in iter_databases(paths, state, mode, user)]
+
+
+def test_filtered_state_does_not_skip_rows_for_other_filters(tmp_path):
+    path = str(tmp_path / 'kiosk.db')
+    make_db(path, [('ann', 'HARD', 5), ('bob', 'EASY', 7)])
+    state = {}
+    assert exported([path], state, mode='HARD') == [('ann', 'HARD', 5)]
+    assert exported([path], state, mode='HARD') == []
+    assert exported([path], state) == [('ann', 'HARD', 5), ('bob', 'EASY', 7)]
+    assert exported([path], state) == []
+
+
+def test_paths_with_uri_characters(tmp_path):
+    directory = tmp_path / 'kiosk #1 ?50%'
+    directory.mkdir()
+    path = str(directory / 'results.db')
+    make_db(path, [('ann', 'EASY', 3)])
+    assert exported([path], {}) == [('ann', 'EASY', 3)]
@@ -0,0 +1,91 @@
+import sqlite3
+import time
+
+import pytest
+
+from leaderboard import Leaderboard
+from results import ResultStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ResultStore(str(tmp_path / 'results.db'), spool_path=str(tmp_path / 'results.spool'), verbose=False)
+    yield store
+    store.close()
+
+
+def test_rank_counts_better_scores(store):
+    for score in (5, 9, 9, 12):
+        store.save('ann', 'EASY', score)
+    store.save('bob', 'HARD', 30)
+    store.flush()
+    leaderboard = Leaderboard(store)
+    assert leaderboard.rank('EASY', 12) == 1
+    assert leaderboard.rank('EASY', 9) == 2
+    assert leaderboard.rank('EASY', 7) == 4
+    assert leaderboard.rank('MEDIUM', 0) == 1
+    leaderboard.close()
+
+
+def test_score_counts_filled_from_existing_results(tmp_path):
+    path = str(tmp_path / 'old.db')
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE game_results (id INTEGER PRIMARY KEY, username TEXT, mode TEXT, score INTEGER)')
+    conn.executemany('INSERT INTO game_results (username, mode, score) VALUES (?, ?, ?)',
+                     [('ann', 'EASY', 4), ('bob', 'EASY', 8), ('cy', 'EASY', 8)])
+    conn.commit()
+    conn.close()
+
+    store = ResultStore(path, spool_path=str(tmp_path / 'old.spool'), verbose=False)
+    store.ready.wait()
+    leaderboard = Leaderboard(store)
+    assert leaderboard.rank('EASY', 4) == 3
+    store.save('dee', 'EASY', 10)
+    store.flush()
+    assert leaderboard.rank('EASY', 4) == 4
+    leaderboard.close()
+    store.close()
+
+
+def test_answer_racing_an_invalidate_is_not_cached(store):
+    store.save('ann', 'EASY', 5)
+    store.flush()
+    leaderboard = Leaderboard(store)
+    conn = leaderboard._connect()
+
+    class CommitDuringQuery:
+        # A batch is committed and invalidated while the lookup is between its miss and its store
+        def execute(self, query, params):
+            cursor = conn.execute(query, params)
+            leaderboard.invalidate([('bob', 'EASY', 9)])
+            return cursor
+
+    leaderboard.conn = CommitDuringQuery()
+    leaderboard.top('EASY')
+    leaderboard.conn = conn
+    assert ('top', 'EASY', 10) not in leaderboard.cache
+
+    leaderboard.top('EASY')
+    assert ('top', 'EASY', 10) in leaderboard.cache
+    leaderboard.close()
+
+
+def test_lookup_gives_up_while_another_kiosk_writes(tmp_path):
+    path = str(tmp_path / 'shared.db')
+    store = ResultStore(path, shared=True, spool_path=str(tmp_path / 'shared.spool'), verbose=False)
+    store.save('ann', 'EASY', 5)
+    store.flush()
+    leaderboard = Leaderboard(store)
+    writer = sqlite3.connect(path, isolation_level=None)
+    writer.execute('BEGIN EXCLUSIVE')  # What a rollback journal holds while it commits
+
+    started = time.perf_counter()
+    assert leaderboard.rank('EASY', 3) is None
+    assert time.perf_counter() - started < 1
+    assert leaderboard.user_stats('ann') == {}
+
+    writer.execute('COMMIT')
+    assert leaderboard.rank('EASY', 3) == 2
+    writer.close()
+    leaderboard.close()
+    store.close()
@@ -0,0 +1,69 @@
+import pytest
+
+from equations import SolutionIndex
+from puzzlebank import HEADER, INDEX_ENTRY, PuzzleBank, count_solving_pairs, generate, tier
+
+
+def solving_pairs(board, operation, target):
+    index = SolutionIndex(board)
+    pairs = dict(index.by_operation[operation])[target]
+    return count_solving_pairs(index.counts, operation, pairs)
+
+
+@pytest.mark.parametrize('board, operation, target, expected', [
+    ([5, 2, 7, 4], '+', 9, 2),     # 5 + 4, 2 + 7
+    ([5, 2, 7, 4], '+', 12, 1),    # 5 + 7
+    ([3, 3, 3, 9], '+', 6, 3),     # any two of the threes
+    ([5, 2, 7, 4], '-', 2, 2),     # 7 - 5, 4 - 2
+    ([5, 2, 7, 4], '-', 1, 1),     # 5 - 4
+    ([5, 2, 7, 2], '-', 3, 2),     # 5 - 2 with either two
+    ([2, 3, 6, 1], '*', 6, 2),     # 2 * 3, 6 * 1
+    ([4, 4, 4, 1], '*', 16, 3),    # any two of the fours
+    ([8, 4, 2, 9], '/', 2, 2),     # 8 / 4, 4 / 2
+    ([6, 3, 9, 7], '/', 2, 1),     # 6 / 3
+])
+def test_count_solving_pairs(board, operation, target, expected):
+    assert solving_pairs(board, operation, target) == expected
+
+
+@pytest.mark.parametrize('board, operation, target, expected', [
+    ([5, 2, 7, 4], '+', 12, 'HARD'),
+    ([5, 2, 7, 4], '+', 9, 'MEDIUM'),
+    ([5, 2, 7, 4], '-', 1, 'HARD'),
+    ([5, 2, 7, 4], '-', 2, 'MEDIUM'),
+    ([6, 5, 4, 3, 2, 1, 8, 7], '-', 1, 'EASY'),  # 2-1, 3-2, ... 8-7
+    ([2, 3, 6, 1], '*', 6, 'MEDIUM'),
+    ([4, 4, 4, 4], '*', 16, 'EASY'),
+    ([6, 3, 9, 7], '/', 2, 'HARD'),
+])
+def test_tier(board, operation, target, expected):
+    assert tier(solving_pairs(board, operation, target)) == expected
+
+
+def damaged_bank(tmp_path, damage):
+    path = tmp_path / 'puzzles.bin'
+    generate(str(path), 12, seed=1)
+    path.write_bytes(damage(path.read_bytes()))
+    return str(path)
+
+
+@pytest.mark.parametrize('damage', [
+    lambda data: b'',
+    lambda data: data[:6],                     # Not even a header
+    lambda data: data[:HEADER.size + 10],      # Cut off in the index
+    lambda data: data[:-1],                    # Cut off in the last record
+    lambda data: data[:HEADER.size] + INDEX_ENTRY.pack(5, 10) + data[HEADER.size + INDEX_ENTRY.size:],
+])
+def test_damaged_bank_is_refused_when_opened(tmp_path, damage):
+    with pytest.raises(ValueError):
+        PuzzleBank(damaged_bank(tmp_path, damage))
+
+
+def test_bank_reads_back_what_was_generated(tmp_path):
+    bank = PuzzleBank(damaged_bank(tmp_path, lambda data: data))
+    assert len(bank) == 12
+    for number in range(len(bank)):
+        board, equation = bank.get(number)
+        a, b = equation.pair
+        assert a in board and b in board
+    bank.close()
@@ -0,0 +1,128 @@
+import json
+import os
+import sqlite3
+
+import pytest
+
+from results import ResultStore
+
+
+def saved_row(user, score, key):
+    # A row as ResultStore spools it: (username, mode, score, played_at, attempts, key)
+    return [user, 'EASY', score, 1700000000.0, {'+': [2, 1]}, key]
+
+
+def scores(path):
+    conn = sqlite3.connect(path)
+    rows = conn.execute('SELECT username, score FROM game_results ORDER BY username').fetchall()
+    games = conn.execute('SELECT COALESCE(SUM(games), 0) FROM user_stats').fetchone()[0]
+    conn.close()
+    return rows, games
+
+
+def test_spooled_rows_are_written_at_startup(tmp_path):
+    path, spool = str(tmp_path / 'results.db'), str(tmp_path / 'results.spool')
+    with open(spool, 'w') as f:
+        f.write(json.dumps(saved_row('ann', 5, 'a' * 32)) + '\n')
+    ResultStore(path, spool_path=spool, verbose=False).close()
+    assert scores(path) == ([('ann', 5)], 1)
+    assert not os.path.exists(spool) and not os.path.exists(spool + '.replaying')
+
+
+def test_replay_interrupted_by_a_kill_is_finished_next_time(tmp_path):
+    # The last run moved its spool aside and died before writing it; new rows were spooled since,
+    # one of the old ones had already landed and the file ends in a line cut short
+    path, spool = str(tmp_path / 'results.db'), str(tmp_path / 'results.spool')
+    store = ResultStore(path, spool_path=spool, verbose=False)
+    store.save('ann', 'EASY', 5)
+    store.close()
+    landed = sqlite3.connect(path).execute('SELECT result_key FROM game_results').fetchone()[0]
+    with open(spool + '.replaying', 'w') as f:
+        f.write(json.dumps(saved_row('ann', 5, landed)) + '\n')
+        f.write(json.dumps(saved_row('bob', 7, 'b' * 32)) + '\n')
+        f.write(json.dumps(saved_row('cy', 9, 'c' * 32))[:20])
+    with open(spool, 'w') as f:
+        f.write(json.dumps(saved_row('dee', 3, 'd' * 32)) + '\n')
+
+    ResultStore(path, spool_path=spool, verbose=False).close()
+    assert scores(path) == ([('ann', 5), ('bob', 7), ('dee', 3)], 3)
+    assert not os.path.exists(spool) and not os.path.exists(spool + '.replaying')
+
+
+def test_unreachable_database_spools_and_keeps_the_rows(tmp_path):
+    spool = str(tmp_path / 'results.spool')
+    store = ResultStore(str(tmp_path / 'missing' / 'results.db'), spool_path=spool, verbose=False)
+    store.save('ann', 'EASY', 5)
+    store.close()
+    with open(spool) as f:
+        assert [json.loads(line)[:3] for line in f] == [['ann', 'EASY', 5]]
+
+
+def test_spooling_after_a_cut_short_line_keeps_the_new_rows(tmp_path):
+    spool = str(tmp_path / 'results.spool')
+    with open(spool, 'w') as f:
+        f.write(json.dumps(saved_row('ann', 5, 'a' * 32))[:20])
+    store = ResultStore(str(tmp_path / 'missing' / 'results.db'), spool_path=spool, verbose=False)
+    store.save('bob', 'EASY', 7)
+    store.close()
+
+    path = str(tmp_path / 'results.db')
+    ResultStore(path, spool_path=spool, verbose=False).close()
+    assert scores(path) == ([('bob', 7)], 1)
+
+
+def spool_games(path, spool, user, count):
+    # A kiosk whose database is out of reach, saving games one at a time
+    store = ResultStore(path, spool_path=spool, verbose=False)
+    for score in range(count):
+        store.save(user, 'EASY', score)
+        store.flush()
+    store.close()
+
+
+def replay_games(path, spool, rounds):
+    for _ in range(rounds):
+        ResultStore(path, spool_path=spool, verbose=False).close()
+
+
+def test_processes_sharing_a_spool_lose_nothing(tmp_path):
+    import multiprocessing
+
+    path, spool = str(tmp_path / 'results.db'), str(tmp_path / 'results.spool')
+    unreachable = str(tmp_path / 'missing' / 'results.db')
+    context = multiprocessing.get_context('spawn')
+    processes = [context.Process(target=spool_games, args=(unreachable, spool, user, 300)) for user in ('ann', 'bob')]
+    processes.append(context.Process(target=replay_games, args=(path, spool, 300)))
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(60)
+        assert process.exitcode == 0
+
+    ResultStore(path, spool_path=spool, verbose=False).close()
+    rows, games = scores(path)
+    assert len(rows) == games == 600
+
+
+def test_a_row_the_database_refuses_does_not_hold_back_the_others(tmp_path):
+    path, spool = str(tmp_path / 'results.db'), str(tmp_path / 'results.spool')
+    with open(spool, 'w') as f:
+        f.write(json.dumps(saved_row('ann', 5, 'a' * 32)) + '\n')
+        f.write(json.dumps(saved_row(None, 6, 'b' * 32)) + '\n')  # Breaks user_stats' NOT NULL
+        f.write(json.dumps(saved_row('bob', 7, 'c' * 32)) + '\n')
+    ResultStore(path, spool_path=spool, verbose=False).close()
+    assert scores(path) == ([('ann', 5), ('bob', 7)], 2)
+    assert not os.path.exists(spool) and not os.path.exists(spool + '.replaying')
+    with open(spool + '.rejected') as f:
+        assert [json.loads(line)[:3] for line in f] == [[None, 'EASY', 6]]
+
+    ResultStore(path, spool_path=spool, verbose=False).close()  # Nothing left to write again
+    assert scores(path) == ([('ann', 5), ('bob', 7)], 2)
+
+
+def test_saving_without_a_user_mode_or_score_is_refused(tmp_path):
+    store = ResultStore(str(tmp_path / 'results.db'), spool_path=str(tmp_path / 'results.spool'), verbose=False)
+    for result in ((None, 'EASY', 6), ('ann', None, 6), ('ann', 'EASY', None)):
+        with pytest.raises(ValueError):
+            store.save(*result)
+    store.close()
@@ -0,0 +1,51 @@
+import pygame
+from collections import OrderedDict
+
+
+class OutlinedTextCache:
+    # Outlined text rendered once into a single surface, keyed by (text, font, colour, outline colour).
+    # The least recently used surfaces are dropped once max_size is reached.
+    def __init__(self, max_size=128, outline=2):
+        self.max_size = max_size
+        self.outline = outline
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, text, font, text_col, outline_col):
+        key = (text, font, text_col, outline_col)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)
+            self.hits += 1
+            return surface
+
+        self.misses += 1
+        surface = self.build(text, font, text_col, outline_col)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_size:
+            self.surfaces.popitem(last=False)
+        return surface
+
+    def build(self, text, font, text_col, outline_col):
+        # The outline is the text drawn in outline_col at the four diagonal offsets, the text sits on top
+        o = self.outline
+        outline_surf = font.render(text, True, outline_col)
+        img = font.render(text, True, text_col)
+
+        surface = pygame.Surface((img.get_width() + 2 * o, img.get_height() + 2 * o), pygame.SRCALPHA)
+        for pos in ((0, 0), (2 * o, 0), (0, 2 * o), (2 * o, 2 * o)):
+            surface.blit(outline_surf, pos)
+        surface.blit(img, (o, o))
+
+        if pygame.display.get_surface() is not None:
+            surface = surface.convert_alpha()
+        return surface
+
+    def draw(self, surface, text, font, text_col, outline_col, x, y):
+        # Blit so the text itself lands at (x, y), like the unoutlined text would
+        img = self.render(text, font, text_col, outline_col)
+        return surface.blit(img, (x - self.outline, y - self.outline))
+
+    def clear(self):
+        self.surfaces.clear()
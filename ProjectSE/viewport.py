@@ -0,0 +1,123 @@
+import argparse
+
+import pygame
+
+
+# Scales whose fonts are kept, so going back and forth (e.g. in and out of fullscreen) doesn't load them again
+KEEP_SCALES = 2
+
+
+class Viewport:
+    # Maps the logical canvas every screen is laid out on onto the window: scaled uniformly to fit
+    # and centred. Coordinates in the game stay logical; what gets drawn is rendered at the window's
+    # scale (see ScaledFont, ScrollingBackground.resize, CardAtlas), so it stays sharp at any size
+    # and is only rebuilt when the window changes, never per frame.
+    def __init__(self, logical_size, window_size=None, load_font=pygame.font.Font):
+        self.logical_size = tuple(logical_size)
+        self.load_font = load_font
+        self.fonts = {}  # scale -> {(path, canvas size): Font}, for the last KEEP_SCALES scales
+        self.scaled_fonts = []  # ScaledFonts to re-resolve on each resize
+        self.points = {}  # canvas point -> window point at the current scale
+        self.window = None
+        self.placed = []  # (UI element, logical rect) kept in place across resizes
+        self.resize(window_size or logical_size)
+
+    def resize(self, window_size):
+        # Returns False if the window already had this size
+        window_size = tuple(window_size)
+        if window_size == self.window:
+            return False
+        self.window = window_size
+        (width, height), (logical_width, logical_height) = window_size, self.logical_size
+        self.scale = min(width / logical_width, height / logical_height)
+        self.offset = ((width - round(logical_width * self.scale)) // 2,
+                       (height - round(logical_height * self.scale)) // 2)
+        self.identity = self.scale == 1 and self.offset == (0, 0)
+        self.points = {}
+        for font in self.scaled_fonts:
+            font.font = self.font(font.path, font.size)
+
+        self.placed = [(element, rect) for element, rect in self.placed if element.alive()]
+        for element, rect in self.placed:
+            self.fit(element, rect)
+        return True
+
+    def point(self, pos):
+        # Text is drawn at the same few points every frame, so each is worked out once per resize
+        if self.identity:
+            return pos
+        point = self.points.get(pos)
+        if point is None:
+            point = self.points[pos] = (self.offset[0] + round(pos[0] * self.scale),
+                                        self.offset[1] + round(pos[1] * self.scale))
+        return point
+
+    def rect(self, rect):
+        # Both corners are scaled, so rects that touch on the canvas still touch in the window
+        rect = pygame.Rect(rect)
+        if self.identity:
+            return rect
+        left, top = self.point(rect.topleft)
+        right, bottom = self.point(rect.bottomright)
+        return pygame.Rect(left, top, right - left, bottom - top)
+
+    def band(self, y, height):
+        # A full-width strip of the canvas, running on to the window's top or bottom edge if it
+        # starts or ends at the canvas edge, so letterboxing never shows a gap above or below it
+        rect = self.rect((0, y, self.logical_size[0], height))
+        top = 0 if y <= 0 else rect.top
+        bottom = self.window[1] if y + height >= self.logical_size[1] else rect.bottom
+        return pygame.Rect(0, top, self.window[0], bottom - top)
+
+    def length(self, length):
+        return max(1, round(length * self.scale))
+
+    def to_logical(self, pos):
+        return ((pos[0] - self.offset[0]) / self.scale, (pos[1] - self.offset[1]) / self.scale)
+
+    def font(self, path, size):
+        fonts = self.fonts.get(self.scale)
+        if fonts is None:
+            if len(self.fonts) >= KEEP_SCALES:
+                del self.fonts[next(iter(self.fonts))]
+            fonts = self.fonts[self.scale] = {}
+        font = fonts.get((path, size))
+        if font is None:
+            font = fonts[path, size] = self.load_font(path, self.length(size))
+        return font
+
+    def place(self, element):
+        # Keep a pygame_gui element created with logical coordinates where it belongs in the window
+        rect = pygame.Rect(element.relative_rect)
+        self.placed.append((element, rect))
+        if not self.identity:
+            self.fit(element, rect)
+        return element
+
+    def fit(self, element, rect):
+        rect = self.rect(rect)
+        element.set_relative_position(rect.topleft)
+        element.set_dimensions(rect.size)
+
+
+class ScaledFont:
+    # A font picked for the logical canvas; font is that font at the viewport's current scale,
+    # loaded when the ScaledFont is made and swapped on each resize
+    __slots__ = ('path', 'size', 'font')
+
+    def __init__(self, viewport, path, size):
+        self.path = path
+        self.size = size
+        self.font = viewport.font(path, size)
+        viewport.scaled_fonts.append(self)
+
+
+def parse_window_size(text):
+    # "WIDTHxHEIGHT" -> (width, height); an argparse type, so argparse shows the message as it is
+    try:
+        width, height = (int(part) for part in text.lower().split('x'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Window size should look like 1920x1080, got {text!r}")
+    if width < 320 or height < 240:
+        raise argparse.ArgumentTypeError(f"Window must be at least 320x240, got {text!r}")
+    return width, height